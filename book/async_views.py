@@ -0,0 +1,59 @@
+import functools
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from book.cache import acache_catalog_response
+from book.inventory_stream import inventory_events
+from book.views import BookViewSet
+from library_service.async_views import AsyncReadView
+
+
+class BookReadView(AsyncReadView):
+    """Async catalog reads, cached and validated like ``BookViewSet``."""
+
+    viewset_class = BookViewSet
+
+    async def alist(self, viewset, request, *args, **kwargs):
+        return await acache_catalog_response(
+            request,
+            functools.partial(
+                super().alist, viewset, request, *args, **kwargs
+            ),
+        )
+
+    async def aretrieve(self, viewset, request, *args, **kwargs):
+        return await acache_catalog_response(
+            request,
+            functools.partial(
+                super().aretrieve, viewset, request, *args, **kwargs
+            ),
+        )
+
+
+def _last_event_id(request):
+    value = request.headers.get("Last-Event-ID") or request.GET.get(
+        "last_event_id"
+    )
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def inventory_stream(request):
+    """Server-sent events with the inventory changes of all books.
+
+    See ``inventory_events``. An idle connection only costs a queue and
+    a periodic heartbeat, so it is only served from asgi.py: under WSGI
+    Django would buffer the endless stream and tie up a worker.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(
+            "Inventory streaming requires the ASGI server.", status=501
+        )
+    return StreamingHttpResponse(
+        inventory_events(_last_event_id(request)),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
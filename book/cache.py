@@ -0,0 +1,179 @@
+import functools
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from rest_framework.response import Response
+
+from library_service.conditional import conditional_validators, set_validators
+
+
+CATALOG_VERSION_KEY = "book:catalog:version"
+CATALOG_HITS_KEY = "book:catalog:hits"
+CATALOG_MISSES_KEY = "book:catalog:misses"
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+
+def incr_counter(key):
+    """Increment a counter that never expires, creating it at 1."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+async def aincr_counter(key):
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        if await cache.aadd(key, 1, timeout=None):
+            return 1
+        return await cache.aincr(key)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+async def aget_catalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response at once."""
+    return incr_counter(CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog_on_commit():
+    transaction.on_commit(bump_catalog_version)
+
+
+def get_catalog_cache_stats():
+    stats = cache.get_many(
+        [CATALOG_VERSION_KEY, CATALOG_HITS_KEY, CATALOG_MISSES_KEY]
+    )
+    return {
+        "version": stats.get(CATALOG_VERSION_KEY, 1),
+        "hits": stats.get(CATALOG_HITS_KEY, 0),
+        "misses": stats.get(CATALOG_MISSES_KEY, 0),
+    }
+
+
+def _response_key(request, version):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"book:catalog:{version}:{url}"
+
+
+def catalog_validators(request, data):
+    """The ETag and Last-Modified timestamp of catalog response data.
+
+    The ETag hashes the data itself and a single book's ``updated_at``
+    is its Last-Modified, so neither depends on the catalog cache and a
+    flushed cache can't lead to a stale 304. Lists only get an ETag, as
+    removing a book leaves the newest ``updated_at`` of a page as is.
+    """
+    digest = hashlib.md5(
+        json.dumps(data, cls=DjangoJSONEncoder).encode()
+    ).hexdigest()
+    modified = None
+    if isinstance(data, dict) and data.get("updated_at"):
+        modified = parse_datetime(str(data["updated_at"]))
+    return conditional_validators(request, modified, (digest,))
+
+
+def _conditional_response(request, data, etag, timestamp, response=None):
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=timestamp
+    )
+    if not_modified is not None:
+        response = not_modified
+    elif response is None:
+        response = Response(data)
+    set_validators(response, etag, timestamp)
+    return response
+
+
+def cache_catalog_response(method):
+    """Cache the response data of anonymous catalog reads.
+
+    Keys embed the current catalog version, so bumping it makes all
+    previously cached pages unreachable without deleting them. The
+    ``catalog_validators`` of the data are cached with it, so
+    conditional requests are answered from the cache as well.
+    """
+
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = None
+        if not request.user.is_authenticated:
+            key = _response_key(request, get_catalog_version())
+            cached = cache.get(key)
+            if cached is not None:
+                incr_counter(CATALOG_HITS_KEY)
+                response = _conditional_response(request, *cached)
+                response["X-Cache"] = "HIT"
+                return response
+            incr_counter(CATALOG_MISSES_KEY)
+
+        response = method(view, request, *args, **kwargs)
+        if response.status_code == 200:
+            etag, timestamp = catalog_validators(request, response.data)
+            if key is not None:
+                cache.set(
+                    key,
+                    (response.data, etag, timestamp),
+                    CATALOG_CACHE_TIMEOUT,
+                )
+            response = _conditional_response(
+                request, response.data, etag, timestamp, response
+            )
+        if key is not None:
+            response["X-Cache"] = "MISS"
+        return response
+
+    return wrapper
+
+
+async def acache_catalog_response(request, get_response):
+    """``cache_catalog_response`` for async views.
+
+    ``get_response`` is only called, and awaited, on a miss.
+    """
+    key = None
+    if not request.user.is_authenticated:
+        key = _response_key(request, await aget_catalog_version())
+        cached = await cache.aget(key)
+        if cached is not None:
+            await aincr_counter(CATALOG_HITS_KEY)
+            response = _conditional_response(request, *cached)
+            response["X-Cache"] = "HIT"
+            return response
+        await aincr_counter(CATALOG_MISSES_KEY)
+
+    response = await get_response()
+    if response.status_code == 200:
+        etag, timestamp = catalog_validators(request, response.data)
+        if key is not None:
+            await cache.aset(
+                key, (response.data, etag, timestamp), CATALOG_CACHE_TIMEOUT
+            )
+        response = _conditional_response(
+            request, response.data, etag, timestamp, response
+        )
+    if key is not None:
+        response["X-Cache"] = "MISS"
+    return response
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from book.cache import incr_counter
+
+
+INVENTORY_SEQUENCE_KEY = "book:inventory:sequence"
+INVENTORY_EVENT_TIMEOUT = 60 * 5
+STREAM_POLL_INTERVAL = 0.5
+STREAM_QUEUE_SIZE = 100
+STREAM_GAP_TIMEOUT = 2
+STREAM_HEARTBEAT_INTERVAL = 15
+STREAM_RETRY_MS = 3000
+
+logger = logging.getLogger(__name__)
+
+
+def _event_key(sequence):
+    return f"book:inventory:event:{sequence}"
+
+
+def publish_inventory_changes(changes):
+    """Append a batch of inventory changes to the event log.
+
+    Each change is ``{"id": book_id, "delta": n}`` for copies taken or
+    given back, or ``{"id": book_id, "inventory": n}`` when the stock
+    was set outright. The log lives in the cache, so every process
+    serving streams sees the changes of every other one.
+    """
+    sequence = incr_counter(INVENTORY_SEQUENCE_KEY)
+    cache.set(_event_key(sequence), changes, INVENTORY_EVENT_TIMEOUT)
+    return sequence
+
+
+def publish_inventory_changes_on_commit(changes):
+    transaction.on_commit(lambda: publish_inventory_changes(changes))
+
+
+async def read_inventory_events(after, until):
+    """Logged events with ``after < sequence <= until``, oldest first.
+
+    Returns None if some of them already expired from the log.
+    """
+    keys = [_event_key(sequence) for sequence in range(after + 1, until + 1)]
+    logged = await cache.aget_many(keys)
+    if len(logged) != len(keys):
+        return None
+    return [
+        (sequence, logged[_event_key(sequence)])
+        for sequence in range(after + 1, until + 1)
+    ]
+
+
+def format_event(sequence, changes):
+    """An ``inventory`` event, or ``reset`` when changes were lost."""
+    if changes is None:
+        return f"id: {sequence}\nevent: reset\ndata: {{}}\n\n"
+    data = json.dumps(changes, separators=(",", ":"))
+    return f"id: {sequence}\nevent: inventory\ndata: {data}\n\n"
+
+
+class InventoryBroadcaster:
+    """Fan the inventory event log out to this process's streams.
+
+    A single task polls the log, however many clients are connected,
+    and only while at least one is. Events missing from the log are
+    broadcast with ``None`` changes. Clients that fall more than
+    ``STREAM_QUEUE_SIZE`` events behind receive ``None`` and are
+    dropped, to resume from the log when they reconnect.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.sequence = None
+        self.task = None
+
+    async def subscribe(self):
+        """A queue of ``(sequence, changes)`` after the returned sequence."""
+        if self.sequence is None:
+            sequence = await cache.aget(INVENTORY_SEQUENCE_KEY, 0)
+            if self.sequence is None:
+                self.sequence = sequence
+
+        queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        return queue, self.sequence
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+            self.sequence = None
+
+    def broadcast(self, sequence, changes):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((sequence, changes))
+            except asyncio.QueueFull:
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def run(self):
+        gap_since = None
+        while True:
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+            try:
+                gap_since = await self.poll(gap_since)
+            except Exception:
+                logger.exception("Polling the inventory event log failed")
+
+    async def poll(self, gap_since):
+        latest = await cache.aget(INVENTORY_SEQUENCE_KEY, 0)
+        if latest < self.sequence:
+            # The cache was flushed and the sequence started over.
+            self.sequence = latest
+            self.broadcast(latest, None)
+            return None
+
+        keys = [
+            _event_key(sequence)
+            for sequence in range(self.sequence + 1, latest + 1)
+        ]
+        logged = await cache.aget_many(keys) if keys else {}
+        for key in keys:
+            changes = logged.get(key)
+            if changes is None:
+                # Published but not stored yet, or already expired, in
+                # which case clients have to start over.
+                gap_since = gap_since or time.monotonic()
+                if time.monotonic() - gap_since < STREAM_GAP_TIMEOUT:
+                    return gap_since
+            self.broadcast(self.sequence + 1, changes)
+            gap_since = None
+            self.sequence += 1
+        return gap_since
+
+
+broadcaster = InventoryBroadcaster()
+
+
+async def inventory_events(last_event_id=None):
+    """The server-sent event stream of inventory changes.
+
+    Clients load ``/api/books/`` once, then apply the ``delta`` or set
+    the ``inventory`` of each change; a ``reset`` event means changes
+    were lost and the list must be loaded again. Reconnecting clients
+    pass the last id they saw to resume after it.
+    """
+    queue, sequence = await broadcaster.subscribe()
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        if last_event_id is not None and last_event_id != sequence:
+            missed = None
+            if last_event_id < sequence:
+                missed = await read_inventory_events(last_event_id, sequence)
+            for event in missed or [(sequence, None)]:
+                yield format_event(*event)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), STREAM_HEARTBEAT_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            yield format_event(*event)
+    finally:
+        broadcaster.unsubscribe(queue)
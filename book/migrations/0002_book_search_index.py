@@ -0,0 +1,56 @@
+from django.db import migrations
+
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE book_book_fts USING fts5("
+    "title, author, content='book_book', content_rowid='id')",
+    "CREATE TRIGGER book_book_fts_ai AFTER INSERT ON book_book BEGIN "
+    "INSERT INTO book_book_fts(rowid, title, author) "
+    "VALUES (new.id, new.title, new.author); END",
+    "CREATE TRIGGER book_book_fts_ad AFTER DELETE ON book_book BEGIN "
+    "INSERT INTO book_book_fts(book_book_fts, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); END",
+    "CREATE TRIGGER book_book_fts_au AFTER UPDATE OF title, author "
+    "ON book_book BEGIN "
+    "INSERT INTO book_book_fts(book_book_fts, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); "
+    "INSERT INTO book_book_fts(rowid, title, author) "
+    "VALUES (new.id, new.title, new.author); END",
+    "INSERT INTO book_book_fts(book_book_fts) VALUES ('rebuild')",
+)
+SQLITE_DROP = (
+    "DROP TRIGGER IF EXISTS book_book_fts_au",
+    "DROP TRIGGER IF EXISTS book_book_fts_ad",
+    "DROP TRIGGER IF EXISTS book_book_fts_ai",
+    "DROP TABLE IF EXISTS book_book_fts",
+)
+
+POSTGRESQL_CREATE = (
+    "CREATE INDEX book_book_search_idx ON book_book USING GIN "
+    "(to_tsvector('english', title || ' ' || author))",
+)
+POSTGRESQL_DROP = ("DROP INDEX IF EXISTS book_book_search_idx",)
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        statements = statements_by_vendor.get(
+            schema_editor.connection.vendor, ()
+        )
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_CREATE, "postgresql": POSTGRESQL_CREATE}),
+            run({"sqlite": SQLITE_DROP, "postgresql": POSTGRESQL_DROP}),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:12
+
+from importlib import import_module
+
+from django.db import migrations, models
+import django.utils.timezone
+
+search_index = import_module("book.migrations.0002_book_search_index")
+
+# SQLite rebuilds book_book to add the column, which drops the triggers
+# keeping the full-text index in sync, so they are recreated around it.
+DROP_SEARCH_INDEX = search_index.run({"sqlite": search_index.SQLITE_DROP})
+CREATE_SEARCH_INDEX = search_index.run({"sqlite": search_index.SQLITE_CREATE})
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0002_book_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(DROP_SEARCH_INDEX, CREATE_SEARCH_INDEX),
+        migrations.AddField(
+            model_name="book",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                db_index=True,
+                default=django.utils.timezone.now,
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(CREATE_SEARCH_INDEX, DROP_SEARCH_INDEX),
+    ]
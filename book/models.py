@@ -12,6 +12,7 @@ class Book(models.Model):
     )
     inventory = models.PositiveIntegerField(default=0)
     daily_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self) -> str:
         return f"name: {self.title}, author: {self.author}"
@@ -0,0 +1,75 @@
+import re
+
+from django.db import NotSupportedError, connections
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+
+def _terms(query):
+    return re.findall(r"\w+", query)
+
+
+def _sqlite_search(queryset, terms):
+    table = queryset.model._meta.db_table
+    match = " ".join(f'"{term}"*' for term in terms)
+
+    return queryset.filter(
+        id__in=RawSQL(
+            f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s",
+            (match,),
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f"SELECT -bm25({table}_fts) FROM {table}_fts "
+            f"WHERE {table}_fts MATCH %s AND rowid = {table}.id",
+            (match,),
+            output_field=FloatField(),
+        )
+    )
+
+
+def _postgresql_search(queryset, terms):
+    table = queryset.model._meta.db_table
+    vector = f"to_tsvector('english', {table}.title || ' ' || {table}.author)"
+    tsquery = " & ".join(f"{term}:*" for term in terms)
+
+    return queryset.filter(
+        RawSQL(
+            f"{vector} @@ to_tsquery('english', %s)",
+            (tsquery,),
+            output_field=BooleanField(),
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f"ts_rank({vector}, to_tsquery('english', %s))",
+            (tsquery,),
+            output_field=FloatField(),
+        )
+    )
+
+
+SEARCH_BACKENDS = {
+    "sqlite": _sqlite_search,
+    "postgresql": _postgresql_search,
+}
+
+
+def search_books(queryset, query):
+    """Filter books by title/author through the full-text index.
+
+    Every term is matched as a prefix and all terms must match. Results
+    are annotated with ``search_rank``, higher meaning more relevant.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0)).none()
+
+    vendor = connections[queryset.db].vendor
+    try:
+        backend = SEARCH_BACKENDS[vendor]
+    except KeyError:
+        raise NotSupportedError(
+            f"Full-text book search is not available on {vendor}."
+        )
+
+    return backend(queryset, terms)
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from book.cache import invalidate_catalog_on_commit
+from book.inventory_stream import publish_inventory_changes_on_commit
+from book.models import Book
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalog_cache(sender, **kwargs):
+    invalidate_catalog_on_commit()
+
+
+@receiver(post_save, sender=Book)
+def publish_inventory(sender, instance, **kwargs):
+    publish_inventory_changes_on_commit(
+        [{"id": instance.id, "inventory": instance.inventory}]
+    )
+
+
+@receiver(post_delete, sender=Book)
+def publish_deletion(sender, instance, **kwargs):
+    publish_inventory_changes_on_commit([{"id": instance.id, "inventory": 0}])
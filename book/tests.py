@@ -1,10 +1,22 @@
+import asyncio
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from book.inventory_stream import (
+    _event_key,
+    broadcaster,
+    inventory_events,
+    publish_inventory_changes,
+    read_inventory_events,
+)
 from book.models import Book
 
 BOOK_URL = reverse("book:book-list")
@@ -60,3 +72,284 @@ class GetCreateBookApiTests(TestCase):
         self.client.force_authenticate(self.user)
         res = self.client.post(BOOK_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+
+class BookPaginationApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.books = [sample_book(title=f"Book {i}") for i in range(5)]
+
+    def test_list_is_cursor_paginated(self):
+        res = self.client.get(BOOK_URL, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertIsNone(res.data["previous"])
+        self.assertEqual(
+            [book["id"] for book in res.data["results"]],
+            [book.id for book in self.books[:2]],
+        )
+
+    def test_next_cursor_continues_after_last_id(self):
+        seen = []
+        url = f"{BOOK_URL}?page_size=2"
+        while url:
+            res = self.client.get(url)
+            seen.extend(book["id"] for book in res.data["results"])
+            url = res.data["next"]
+
+        self.assertEqual(seen, [book.id for book in self.books])
+
+
+class BookSearchApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("test@test.com", "testpass")
+        )
+        self.dune = sample_book(title="Dune", author="Frank Herbert")
+        self.messiah = sample_book(
+            title="Dune Messiah", author="Frank Herbert"
+        )
+        self.hobbit = sample_book(
+            title="The Hobbit", author="J. R. R. Tolkien"
+        )
+
+    def search(self, query):
+        res = self.client.get(BOOK_URL, {"search": query})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [book["id"] for book in res.data["results"]]
+
+    def test_search_matches_title_and_author_prefixes(self):
+        self.assertEqual(self.search("tolk"), [self.hobbit.id])
+        self.assertEqual(
+            sorted(self.search("herbert dune")),
+            sorted([self.dune.id, self.messiah.id]),
+        )
+
+    def test_search_orders_by_relevance(self):
+        self.assertEqual(self.search("dune")[0], self.dune.id)
+
+    def test_search_ignores_query_syntax(self):
+        self.assertEqual(self.search('"hobbit"* ^('), [self.hobbit.id])
+        self.assertEqual(self.search("!!!"), [])
+
+    def test_index_follows_bulk_create_update_and_delete(self):
+        (imported,) = Book.objects.bulk_create(
+            [
+                Book(
+                    title="Neuromancer",
+                    author="William Gibson",
+                    cover="SOFT",
+                    daily_fee=1,
+                )
+            ]
+        )
+        self.assertEqual(self.search("neuromancer"), [imported.id])
+
+        Book.objects.filter(id=imported.id).update(title="Count Zero")
+        self.assertEqual(self.search("neuromancer"), [])
+        self.assertEqual(self.search("count zero"), [imported.id])
+
+        Book.objects.filter(id=imported.id).delete()
+        self.assertEqual(self.search("gibson"), [])
+
+    def test_index_follows_api_update(self):
+        admin = get_user_model().objects.create_user(
+            "admin@admin.com", "testpass", is_staff=True
+        )
+        self.client.force_authenticate(admin)
+        self.client.patch(
+            detail_url(self.hobbit.id), {"title": "Silmarillion"}
+        )
+
+        self.assertEqual(self.search("hobbit"), [])
+        self.assertEqual(self.search("silmarillion"), [self.hobbit.id])
+
+
+class BookCatalogCacheApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = sample_book(title="Dune")
+
+    def test_anonymous_reads_are_cached(self):
+        res = self.client.get(BOOK_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOK_URL)
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.assertEqual(res.data["results"][0]["title"], "Dune")
+
+        self.client.get(detail_url(self.book.id))
+        res = self.client.get(detail_url(self.book.id))
+        self.assertEqual(res["X-Cache"], "HIT")
+
+    def test_book_change_invalidates_cache(self):
+        self.client.get(detail_url(self.book.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = "Dune Messiah"
+            self.book.save()
+
+        res = self.client.get(detail_url(self.book.id))
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["title"], "Dune Messiah")
+
+    def test_authenticated_reads_bypass_cache(self):
+        user = get_user_model().objects.create_user(
+            "test@test.com", "testpass"
+        )
+        self.client.force_authenticate(user)
+        self.client.get(BOOK_URL)
+        res = self.client.get(BOOK_URL)
+        self.assertNotIn("X-Cache", res)
+
+    def test_cache_stats_are_admin_only(self):
+        self.client.get(BOOK_URL)
+        self.client.get(BOOK_URL)
+        url = reverse("book:book-cache-stats")
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        admin = get_user_model().objects.create_user(
+            "admin@admin.com", "testpass", is_staff=True
+        )
+        self.client.force_authenticate(admin)
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["hits"], 1)
+        self.assertEqual(res.data["misses"], 1)
+
+
+class BookConditionalGetApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = sample_book(title="Dune")
+        self.url = reverse("book:book-list")
+
+    def test_unchanged_catalog_returns_304_without_queries(self):
+        res = self.client.get(self.url)
+        etag = res["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+
+    def test_flushed_cache_does_not_hide_changes(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        sample_book(title="Emma")
+        cache.clear()
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_flushed_cache_still_honours_unchanged_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        cache.clear()
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changed_catalog_returns_new_body(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sample_book(title="Emma")
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_last_modified_is_honoured(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        url = reverse("book:book-detail", args=[self.book.id])
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@patch("book.inventory_stream.STREAM_POLL_INTERVAL", 0.01)
+class InventoryStreamTests(TestCase):
+    STREAM_URL = reverse("book:inventory-stream")
+
+    def setUp(self):
+        cache.clear()
+
+    async def open_stream(self, last_event_id=None):
+        events = inventory_events(last_event_id)
+        self.assertEqual(await anext(events), "retry: 3000\n\n")
+        return events
+
+    async def test_endpoint_is_an_event_stream(self):
+        response = await self.async_client.get(self.STREAM_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+    def test_endpoint_is_not_served_under_wsgi(self):
+        response = self.client.get(self.STREAM_URL)
+
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+    def test_saving_a_book_publishes_its_inventory(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = sample_book(inventory=3)
+
+        self.assertEqual(
+            async_to_sync(read_inventory_events)(0, 1),
+            [(1, [{"id": book.id, "inventory": 3}])],
+        )
+
+    async def test_stream_sends_published_changes(self):
+        content = await self.open_stream()
+
+        publish_inventory_changes([{"id": 1, "delta": -1}])
+        event = await asyncio.wait_for(anext(content), 1)
+
+        self.assertEqual(
+            event, 'id: 1\nevent: inventory\ndata: [{"id":1,"delta":-1}]\n\n'
+        )
+        await content.aclose()
+        self.assertFalse(broadcaster.subscribers)
+        self.assertIsNone(broadcaster.task)
+
+    async def test_reconnecting_client_resumes_after_last_event(self):
+        publish_inventory_changes([{"id": 1, "delta": -1}])
+        publish_inventory_changes([{"id": 1, "delta": 1}])
+
+        content = await self.open_stream(1)
+
+        self.assertEqual(
+            await anext(content),
+            'id: 2\nevent: inventory\ndata: [{"id":1,"delta":1}]\n\n',
+        )
+        await content.aclose()
+
+    async def test_client_starts_over_when_changes_expired(self):
+        publish_inventory_changes([{"id": 1, "delta": -1}])
+        publish_inventory_changes([{"id": 1, "delta": 1}])
+        await cache.adelete(_event_key(2))
+
+        content = await self.open_stream(1)
+
+        self.assertEqual(
+            await anext(content), "id: 2\nevent: reset\ndata: {}\n\n"
+        )
+        await content.aclose()
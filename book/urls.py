@@ -1,10 +1,40 @@
+from django.conf import settings
+from django.urls import path
 from rest_framework import routers
 
+from book.async_views import BookReadView, inventory_stream
 from book.views import BookViewSet
 
 router = routers.DefaultRouter()
 router.register("", BookViewSet)
 
-urlpatterns = router.urls
+urlpatterns = [
+    path(
+        "inventory/stream/",
+        inventory_stream,
+        name="inventory-stream",
+    ),
+] + router.urls
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path(
+            "",
+            BookReadView.as_view({"get": "list", "post": "create"}),
+            name="book-list",
+        ),
+        path(
+            "<int:pk>/",
+            BookReadView.as_view(
+                {
+                    "get": "retrieve",
+                    "put": "update",
+                    "patch": "partial_update",
+                    "delete": "destroy",
+                }
+            ),
+            name="book-detail",
+        ),
+    ] + urlpatterns
 
 app_name = "book"
@@ -1,16 +1,49 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from book.cache import cache_catalog_response, get_catalog_cache_stats
 from book.models import Book
+from book.search import search_books
 from book.serializers import (
     BookListCreateSerializer,
     BookDetailSerializer,
 )
+from library_service.async_views import AsyncCursorPagination
+from library_service.fast_list import ValuesListMixin
+from library_service.renderers import OrjsonRenderer
+from library_service.replica import ReplicaReadMixin
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookPagination(AsyncCursorPagination):
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "id"
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get("search"):
+            return ("-search_rank", "id")
+        return super().get_ordering(request, queryset, view)
+
+
+class BookViewSet(ReplicaReadMixin, ValuesListMixin, viewsets.ModelViewSet):
     serializer_class = BookListCreateSerializer
     permission_classes = (IsAdminUser,)
     queryset = Book.objects.all()
+    pagination_class = BookPagination
+    renderer_classes = (OrjsonRenderer, BrowsableAPIRenderer)
+
+    def get_queryset(self):
+        queryset = self.queryset
+        search = self.request.query_params.get("search")
+
+        if self.action == "list" and search:
+            queryset = search_books(queryset, search)
+
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ("PUT", "PATCH", "DELETE"):
@@ -18,9 +51,33 @@ class BookViewSet(viewsets.ModelViewSet):
         return BookListCreateSerializer
 
     def get_permissions(self):
-        if self.request.method == "GET":
+        if self.request.method == "GET" and self.action != "cache_stats":
             self.permission_classes = (AllowAny,)
         return super(BookViewSet, self).get_permissions()
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="search",
+                description="Full-text search by title and author, "
+                "ordered by relevance",
+                required=False,
+                type=OpenApiTypes.STR,
+            ),
+        ]
+    )
+    @cache_catalog_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_catalog_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=["GET"], url_path="cache-stats")
+    def cache_stats(self, request):
+        """Hit and miss counters of the anonymous catalog cache"""
+        return Response(get_catalog_cache_stats())
+
 
 # Create your views here.
@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from borrowing.models import Borrowing, Payment
+from user.models import AccountSummary
+
+
+SUMMARY_FIELDS = (
+    "active_borrowings",
+    "pending_payments",
+    "outstanding_balance",
+)
+
+
+def empty_summary():
+    return {
+        "active_borrowings": 0,
+        "pending_payments": 0,
+        "outstanding_balance": Decimal("0.00"),
+    }
+
+
+def compute_account_summaries(user_ids=None):
+    """Aggregate summaries from the borrowing and payment tables.
+
+    Returns a dict of user id to summary values, containing only users
+    with active borrowings or pending payments.
+    """
+    borrowings = Borrowing.objects.filter(actual_return_date=None)
+    payments = Payment.objects.filter(status=Payment.StatusChoices.PENDING)
+    if user_ids is not None:
+        borrowings = borrowings.filter(user_id__in=user_ids)
+        payments = payments.filter(borrowing__user_id__in=user_ids)
+
+    summaries = {}
+    for row in borrowings.values("user_id").annotate(count=Count("id")):
+        summary = summaries.setdefault(row["user_id"], empty_summary())
+        summary["active_borrowings"] = row["count"]
+
+    for row in payments.values("borrowing__user_id").annotate(
+        count=Count("id"), total=Sum("money_to_pay")
+    ):
+        summary = summaries.setdefault(
+            row["borrowing__user_id"], empty_summary()
+        )
+        summary["pending_payments"] = row["count"]
+        summary["outstanding_balance"] = row["total"]
+
+    return summaries
+
+
+def _create_account_summary(user_id, changes=None):
+    values = compute_account_summaries([user_id]).get(user_id, empty_summary())
+    try:
+        with transaction.atomic():
+            return AccountSummary.objects.create(user_id=user_id, **values)
+    except IntegrityError:
+        if changes:
+            AccountSummary.objects.filter(user_id=user_id).update(**changes)
+        return AccountSummary.objects.get(user_id=user_id)
+
+
+def get_account_summary(user_id):
+    """Return the summary row of a user, building it on first use."""
+    summary = AccountSummary.objects.filter(user_id=user_id).first()
+    if summary is None:
+        summary = _create_account_summary(user_id)
+    return summary
+
+
+def adjust_account_summary(
+    user_id, active_borrowings=0, pending_payments=0, outstanding_balance=0
+):
+    """Apply deltas to a user's summary with a single UPDATE.
+
+    Call it in the same transaction and after the borrowing or payment
+    rows it accounts for were written: a missing summary is built from
+    those tables and therefore already includes the change.
+    """
+    deltas = {
+        "active_borrowings": active_borrowings,
+        "pending_payments": pending_payments,
+        "outstanding_balance": outstanding_balance,
+    }
+    changes = {
+        field: F(field) + delta for field, delta in deltas.items() if delta
+    }
+    if not changes:
+        return
+
+    if not AccountSummary.objects.filter(user_id=user_id).update(**changes):
+        _create_account_summary(user_id, changes)
+
+
+def refresh_account_summaries(user_ids=None):
+    """Recompute summaries in bulk, for the given users or everyone.
+
+    Summaries of users without activity are zeroed, missing ones are
+    created. Returns the number of users with activity.
+    """
+    summaries = compute_account_summaries(user_ids)
+
+    idle = AccountSummary.objects.exclude(user_id__in=summaries.keys())
+    if user_ids is not None:
+        idle = idle.filter(user_id__in=user_ids)
+    idle.update(**empty_summary())
+
+    AccountSummary.objects.bulk_create(
+        [
+            AccountSummary(user_id=user_id, **values)
+            for user_id, values in summaries.items()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=list(SUMMARY_FIELDS),
+    )
+    return len(summaries)
@@ -0,0 +1,17 @@
+from borrowing.views import (
+    BorrowingViewSet,
+    PaymentViewSet,
+    aborrowings_version,
+)
+from library_service.async_views import AsyncReadView
+
+
+class BorrowingReadView(AsyncReadView):
+    viewset_class = BorrowingViewSet
+
+    async def get_version(self, viewset, request, *args, **kwargs):
+        return await aborrowings_version(viewset, request, *args, **kwargs)
+
+
+class PaymentReadView(AsyncReadView):
+    viewset_class = PaymentViewSet
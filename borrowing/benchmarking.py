@@ -0,0 +1,105 @@
+import math
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from book.models import Book
+from borrowing.models import Borrowing, Payment
+
+
+SEED_BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+@contextmanager
+def replace_attributes(target, **attributes):
+    original = {name: getattr(target, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in original.items():
+            setattr(target, name, value)
+
+
+def seed_users(emails):
+    return get_user_model().objects.bulk_create(
+        (get_user_model()(email=email) for email in emails),
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+
+def seed_books(count, author, inventory=10):
+    """Books titled after their ``author`` so cleanups can find them."""
+    return Book.objects.bulk_create(
+        (
+            Book(
+                title=f"{author} book {number}",
+                author=author,
+                cover="SOFT",
+                inventory=inventory,
+                daily_fee=1,
+            )
+            for number in range(count)
+        ),
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+
+def seed_borrowings(borrowings, payment_status, money_to_pay=7):
+    """Insert ``borrowings`` with one payment each.
+
+    ``payment_status`` is either a status or a function of the
+    borrowing returning one.
+    """
+    borrowings = Borrowing.objects.bulk_create(
+        borrowings, batch_size=SEED_BATCH_SIZE
+    )
+    Payment.objects.bulk_create(
+        (
+            Payment(
+                borrowing=borrowing,
+                status=(
+                    payment_status(borrowing)
+                    if callable(payment_status)
+                    else payment_status
+                ),
+                type=Payment.TypeChoices.PAYMENT,
+                money_to_pay=money_to_pay,
+            )
+            for borrowing in borrowings
+        ),
+        batch_size=SEED_BATCH_SIZE,
+    )
+    return borrowings
+
+
+def request_host():
+    """A host name ``ALLOWED_HOSTS`` accepts."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*" and not host.startswith("."):
+            return host
+    return "localhost"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
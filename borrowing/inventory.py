@@ -0,0 +1,51 @@
+from django.db.models import F
+from django.utils import timezone
+
+from book.cache import invalidate_catalog_on_commit
+from book.inventory_stream import publish_inventory_changes_on_commit
+from book.models import Book
+
+
+def reserve_book(book_id):
+    """Take one copy of a book if any is left.
+
+    The check and the decrement are a single conditional UPDATE, so
+    concurrent borrowers can neither oversell nor lose updates, and no
+    row is locked longer than that statement. Returns False when the
+    book is out of stock.
+    """
+    reserved = Book.objects.filter(pk=book_id, inventory__gt=0).update(
+        inventory=F("inventory") - 1, updated_at=timezone.now()
+    )
+    if reserved:
+        invalidate_catalog_on_commit()
+        publish_inventory_changes_on_commit([{"id": book_id, "delta": -1}])
+    return bool(reserved)
+
+
+def release_book(book_id, copies=1):
+    """Put copies of a book back on the shelf."""
+    Book.objects.filter(pk=book_id).update(
+        inventory=F("inventory") + copies, updated_at=timezone.now()
+    )
+    invalidate_catalog_on_commit()
+    publish_inventory_changes_on_commit([{"id": book_id, "delta": copies}])
+
+
+def reserve_books(book_ids):
+    """Take one copy of each book, or none at all.
+
+    Must run inside a transaction: when some book is out of stock the
+    copies already taken by this statement are only given back by the
+    caller's rollback. Returns False in that case.
+    """
+    reserved = Book.objects.filter(pk__in=book_ids, inventory__gt=0).update(
+        inventory=F("inventory") - 1, updated_at=timezone.now()
+    )
+    if reserved:
+        invalidate_catalog_on_commit()
+    if reserved == len(book_ids):
+        publish_inventory_changes_on_commit(
+            [{"id": book_id, "delta": -1} for book_id in book_ids]
+        )
+    return reserved == len(book_ids)
@@ -0,0 +1,265 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import transaction
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.models import Book
+from borrowing.benchmarking import (
+    percentile,
+    request_host,
+    seed_books,
+    seed_borrowings,
+    seed_users,
+)
+from borrowing.models import Borrowing, Payment
+
+
+BENCHMARK_EMAIL = "bench-async@library.test"
+BENCHMARK_AUTHOR = "Async benchmark"
+SERVERS = ("wsgi", "asgi")
+
+
+def summarize(results, duration, concurrency):
+    """Throughput and latency percentiles of ``(latency, status)`` pairs."""
+    latencies = [latency for latency, _ in results]
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "errors": sum(1 for _, status in results if status != 200),
+        "duration": round(duration, 3),
+        "requests_per_second": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def run_wsgi(paths, token, requests, concurrency):
+    """Call the WSGI application from ``concurrency`` threads."""
+    application = get_wsgi_application()
+    host = request_host()
+
+    def call(path):
+        status = []
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": host,
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": host,
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        if token:
+            environ["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+        started = time.perf_counter()
+        body = application(
+            environ, lambda value, headers: status.append(value)
+        )
+        b"".join(body)
+        body.close()
+        return time.perf_counter() - started, int(status[0].split()[0])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(
+            pool.map(call, (paths[i % len(paths)] for i in range(requests)))
+        )
+    return results, time.perf_counter() - started
+
+
+def run_asgi(paths, token, requests, concurrency):
+    """Drive the ASGI application with ``concurrency`` concurrent tasks."""
+    application = get_asgi_application()
+    host = request_host().encode()
+
+    async def call(path):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "headers": [(b"host", host)],
+            "server": ("localhost", 80),
+            "client": ("127.0.0.1", 0),
+        }
+        if token:
+            scope["headers"].append(
+                (b"authorization", f"Bearer {token}".encode())
+            )
+        sent = asyncio.Event()
+        messages = []
+
+        async def receive():
+            if not messages:
+                messages.append(None)
+                return {"type": "http.request", "body": b""}
+            await sent.wait()
+            return {"type": "http.disconnect"}
+
+        status = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+            elif not message.get("more_body"):
+                sent.set()
+
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        return time.perf_counter() - started, status[0]
+
+    async def load():
+        queue = iter(paths[i % len(paths)] for i in range(requests))
+        results = []
+
+        async def worker():
+            for path in queue:
+                results.append(await call(path))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results, time.perf_counter() - started
+
+    return asyncio.run(load())
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput and p99 latency of the book, borrowing "
+        "and payment reads served by the sync WSGI application and by "
+        "the ASGI application with the async read views. Each server "
+        "runs in its own process against seeded rows that are deleted "
+        "afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument("--rows", type=int, default=100)
+        parser.add_argument(
+            "--output", help="Write the results to this JSON file."
+        )
+        parser.add_argument(
+            "--serve",
+            choices=SERVERS,
+            help="Only run the load against this server in-process and "
+            "print its results as JSON.",
+        )
+        parser.add_argument("--path", action="append", default=[])
+        parser.add_argument("--token", default="")
+
+    def handle(self, *args, **options):
+        if options["serve"]:
+            self.serve(options)
+            return
+
+        results = {}
+        try:
+            paths, token = self.seed(options["rows"])
+            for server in SERVERS:
+                results[server] = self.run_server(
+                    server, paths, token, options
+                )
+                self.stdout.write(
+                    f"{server}: {results[server]['requests_per_second']} "
+                    f"req/s, p50 {results[server]['p50_ms']} ms, "
+                    f"p99 {results[server]['p99_ms']} ms, "
+                    f"{results[server]['errors']} errors"
+                )
+        finally:
+            self.cleanup()
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+
+    def serve(self, options):
+        run = run_asgi if options["serve"] == "asgi" else run_wsgi
+        results, duration = run(
+            options["path"],
+            options["token"],
+            options["requests"],
+            options["concurrency"],
+        )
+        result = summarize(results, duration, options["concurrency"])
+        result["async_read_views"] = settings.ASYNC_READ_VIEWS
+        self.stdout.write(json.dumps(result))
+
+    def run_server(self, server, paths, token, options):
+        command = [
+            sys.executable,
+            sys.argv[0],
+            "benchmark_async_reads",
+            "--serve",
+            server,
+            f"--requests={options['requests']}",
+            f"--concurrency={options['concurrency']}",
+            f"--token={token}",
+            *(f"--path={path}" for path in paths),
+        ]
+        env = {
+            **os.environ,
+            "ASYNC_READ_VIEWS": "1" if server == "asgi" else "0",
+        }
+        process = subprocess.run(
+            command, env=env, capture_output=True, text=True
+        )
+        if process.returncode:
+            raise CommandError(f"{server} run failed:\n{process.stderr}")
+        return json.loads(process.stdout.splitlines()[-1])
+
+    @transaction.atomic
+    def seed(self, rows):
+        self.cleanup()
+        (user,) = seed_users([BENCHMARK_EMAIL])
+        books = seed_books(rows, BENCHMARK_AUTHOR)
+        borrowings = seed_borrowings(
+            (
+                Borrowing(
+                    user=user,
+                    book=book,
+                    expected_return_date=date.today() + timedelta(days=7),
+                )
+                for book in books
+            ),
+            Payment.StatusChoices.PAID,
+        )
+
+        paths = [
+            reverse("book:book-list"),
+            reverse("book:book-detail", args=[books[0].id]),
+            reverse("borrowing:borrowing-list"),
+            reverse("borrowing:borrowing-detail", args=[borrowings[0].id]),
+            reverse("borrowing:payment-list"),
+        ]
+        return paths, str(AccessToken.for_user(user))
+
+    def cleanup(self):
+        get_user_model().objects.filter(email=BENCHMARK_EMAIL).delete()
+        Book.objects.filter(author=BENCHMARK_AUTHOR).delete()
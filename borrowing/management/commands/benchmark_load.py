@@ -0,0 +1,474 @@
+import io
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import date, timedelta
+
+import stripe
+from celery.app.task import Task
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from book.models import Book
+from borrowing.benchmarking import (
+    percentile,
+    replace_attributes,
+    request_host,
+    seed_books,
+)
+from borrowing.models import Notification, StripeEvent
+from borrowing.notification_service import telegram_client
+from library_service.stubs import (
+    StripeStub,
+    TelegramStub,
+    sign_stripe_payload,
+)
+
+
+LOAD_EMAIL_PREFIX = "load-"
+LOAD_EMAIL_DOMAIN = "@library.test"
+LOAD_AUTHOR = "Load test"
+LOAD_BOOK_TITLE = f"{LOAD_AUTHOR} book"
+LOAD_PASSWORD = "load-test-password"
+LOAD_WEBHOOK_SECRET = "whsec_load_test"
+LOAD_EVENT_PREFIX = "evt_load_"
+ENDPOINTS = (
+    "register",
+    "token",
+    "book_list",
+    "book_detail",
+    "borrow",
+    "payment_detail",
+    "stripe_webhook",
+    "payment_success",
+    "return",
+)
+
+
+@contextmanager
+def task_worker(workers):
+    """Run Celery tasks queued with ``delay`` on a local thread pool.
+
+    Stands in for a worker process, so the stubbed Stripe and Telegram
+    calls happen off the request path as in production. With no
+    workers, tasks run inline in the thread that queued them.
+    """
+    executor = ThreadPoolExecutor(workers) if workers else None
+
+    def run(task, args, kwargs):
+        try:
+            task.apply(args=args, kwargs=kwargs)
+        finally:
+            if executor is not None:
+                connection.close()
+
+    def apply_async(task, args=None, kwargs=None, **options):
+        if executor is None:
+            run(task, args or (), kwargs or {})
+        else:
+            executor.submit(run, task, args or (), kwargs or {})
+
+    try:
+        with replace_attributes(Task, apply_async=apply_async):
+            yield
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+class WSGIClient:
+    """Call the WSGI application directly and time each request."""
+
+    def __init__(self, application, recorder):
+        self.application = application
+        self.recorder = recorder
+        self.host = request_host()
+
+    def call(self, endpoint, method, path, data=None, token=None, **headers):
+        body = b"" if data is None else data
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": self.host,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        if token:
+            environ["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        for name, value in headers.items():
+            environ[f"HTTP_{name.upper()}"] = value
+
+        status = []
+        started = time.perf_counter()
+        response = self.application(
+            environ, lambda value, headers: status.append(value)
+        )
+        content = b"".join(response)
+        response.close()
+        self.recorder.record(
+            endpoint, time.perf_counter() - started, int(status[0][:3])
+        )
+
+        try:
+            return int(status[0][:3]), json.loads(content)
+        except ValueError:
+            return int(status[0][:3]), None
+
+
+class Recorder:
+    def __init__(self):
+        self.results = {endpoint: [] for endpoint in ENDPOINTS}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency, status):
+        with self._lock:
+            self.results[endpoint].append((latency, status))
+
+    def summary(self, duration):
+        """Throughput and latency percentiles per endpoint and overall."""
+
+        def stats(results):
+            latencies = [latency for latency, _ in results]
+            return {
+                "requests": len(results),
+                "errors": sum(1 for _, status in results if status >= 400),
+                "requests_per_second": round(len(results) / duration, 1),
+                "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            }
+
+        endpoints = {
+            endpoint: stats(results)
+            for endpoint, results in self.results.items()
+            if results
+        }
+        everything = [
+            result for results in self.results.values() for result in results
+        ]
+        return endpoints, stats(everything) if everything else None
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the service end to end: virtual users register, get a "
+        "token, browse books, borrow, pay through a Stripe webhook and "
+        "return the book, against the real URLconf. Stripe and Telegram "
+        "are local stub servers and Celery tasks run on an in-process "
+        "worker pool. Reports throughput and p50/p95/p99 per endpoint as "
+        "JSON; seeded and created rows are deleted afterwards. Only runs "
+        "against a dedicated benchmark database (BENCHMARK_DATABASE=1) "
+        "unless --allow-writes is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=50,
+            help="Virtual users, each running its own journey.",
+        )
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=3,
+            help="Borrow, pay and return cycles per user.",
+        )
+        parser.add_argument(
+            "--browse",
+            type=int,
+            default=5,
+            help="Book list and detail reads before each borrowing.",
+        )
+        parser.add_argument("--books", type=int, default=100)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Task worker threads; 0 runs tasks inline.",
+        )
+        parser.add_argument(
+            "--stripe-latency",
+            type=float,
+            default=0.2,
+            help="Seconds the Stripe stub waits before answering.",
+        )
+        parser.add_argument(
+            "--telegram-latency",
+            type=float,
+            default=0.05,
+            help="Seconds the Telegram stub waits before answering.",
+        )
+        parser.add_argument(
+            "--payment-timeout",
+            type=float,
+            default=10,
+            help="Seconds a user polls for the Stripe session.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output", help="Write the results to this JSON file."
+        )
+        parser.add_argument(
+            "--allow-writes",
+            action="store_true",
+            help="Run even though the database is not a dedicated "
+            "benchmark database.",
+        )
+
+    def handle(self, *args, **options):
+        if not (settings.BENCHMARK_DATABASE or options["allow_writes"]):
+            raise CommandError(
+                "The load test registers users and writes borrowings, "
+                "payments and books to the default database. Point it at "
+                "a dedicated benchmark database with BENCHMARK_DATABASE=1 "
+                "or pass --allow-writes."
+            )
+
+        self.run_id = uuid.uuid4().hex[:8]
+        self.options = options
+        recorder = Recorder()
+        client = WSGIClient(get_wsgi_application(), recorder)
+
+        try:
+            self.book_ids = self.seed(options["books"])
+            with ExitStack() as stack:
+                stripe_stub = stack.enter_context(
+                    StripeStub(latency=options["stripe_latency"])
+                )
+                telegram_stub = stack.enter_context(
+                    TelegramStub(latency=options["telegram_latency"])
+                )
+                stack.enter_context(
+                    replace_attributes(
+                        stripe, api_base=stripe_stub.url, api_key="sk_load"
+                    )
+                )
+                stack.enter_context(
+                    replace_attributes(
+                        telegram_client,
+                        api_url=f"{telegram_stub.url}/botLOAD/sendMessage",
+                    )
+                )
+                stack.enter_context(
+                    override_settings(
+                        STRIPE_WEBHOOK_SECRET=LOAD_WEBHOOK_SECRET
+                    )
+                )
+                stack.enter_context(task_worker(options["workers"]))
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(options["concurrency"]) as pool:
+                    list(
+                        pool.map(
+                            lambda number: self.journey(client, number),
+                            range(options["users"]),
+                        )
+                    )
+                duration = time.perf_counter() - started
+        finally:
+            self.cleanup()
+
+        endpoints, total = recorder.summary(duration)
+        results = {
+            "commit": current_commit(),
+            "config": {
+                name: options[name]
+                for name in (
+                    "users",
+                    "concurrency",
+                    "iterations",
+                    "browse",
+                    "books",
+                    "workers",
+                    "stripe_latency",
+                    "telegram_latency",
+                    "seed",
+                )
+            },
+            "duration": round(duration, 3),
+            "total": total,
+            "endpoints": endpoints,
+            "stubs": {
+                "stripe_sessions": len(stripe_stub.sessions),
+                "telegram_messages": len(telegram_stub.messages),
+            },
+        }
+
+        for endpoint, stats in endpoints.items():
+            self.stdout.write(
+                f"{endpoint}: {stats['requests']} requests, "
+                f"{stats['requests_per_second']} req/s, "
+                f"p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, "
+                f"p99 {stats['p99_ms']} ms, {stats['errors']} errors"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+        else:
+            self.stdout.write(json.dumps(results))
+
+    def journey(self, client, number):
+        try:
+            self._journey(client, number)
+        finally:
+            connection.close()
+
+    def _journey(self, client, number):
+        options = self.options
+        rng = random.Random(f"{options['seed']}-{number}")
+        credentials = {
+            "email": f"{LOAD_EMAIL_PREFIX}{self.run_id}-{number}"
+            f"{LOAD_EMAIL_DOMAIN}",
+            "password": LOAD_PASSWORD,
+        }
+
+        client.call("register", "POST", reverse("user:create"), credentials)
+        status, body = client.call(
+            "token", "POST", reverse("user:token_obtain_pair"), credentials
+        )
+        if status != 200:
+            return
+        token = body["access"]
+
+        for _ in range(options["iterations"]):
+            for _ in range(options["browse"]):
+                client.call(
+                    "book_list", "GET", reverse("book:book-list"), token=token
+                )
+                client.call(
+                    "book_detail",
+                    "GET",
+                    reverse(
+                        "book:book-detail", args=[rng.choice(self.book_ids)]
+                    ),
+                    token=token,
+                )
+
+            status, body = client.call(
+                "borrow",
+                "POST",
+                reverse("borrowing:borrowing-list"),
+                {
+                    "book": rng.choice(self.book_ids),
+                    "expected_return_date": (
+                        date.today() + timedelta(days=rng.randint(1, 14))
+                    ).isoformat(),
+                },
+                token=token,
+            )
+            if status != 201:
+                continue
+            borrowing_id = body["id"]
+            payment_id = body["payments"][0]["id"]
+
+            session_id = self.wait_for_session(client, payment_id, token)
+            if session_id:
+                self.complete_session(client, session_id)
+            client.call(
+                "payment_success",
+                "GET",
+                reverse("borrowing:payment_success", args=[payment_id]),
+                token=token,
+            )
+            client.call(
+                "return",
+                "POST",
+                reverse(
+                    "borrowing:borrowing-book-return", args=[borrowing_id]
+                ),
+                token=token,
+            )
+
+    def wait_for_session(self, client, payment_id, token):
+        """Poll the payment like a client waiting for its checkout URL."""
+        deadline = time.monotonic() + self.options["payment_timeout"]
+        delay = 0.01
+        while time.monotonic() < deadline:
+            status, body = client.call(
+                "payment_detail",
+                "GET",
+                reverse("borrowing:payment-detail", args=[payment_id]),
+                token=token,
+            )
+            if status == 200 and body["session_id"]:
+                return body["session_id"]
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        return None
+
+    def complete_session(self, client, session_id):
+        payload = json.dumps(
+            {
+                "id": f"{LOAD_EVENT_PREFIX}{uuid.uuid4().hex}",
+                "object": "event",
+                "type": "checkout.session.completed",
+                "data": {
+                    "object": {
+                        "id": session_id,
+                        "object": "checkout.session",
+                        "payment_status": "paid",
+                    }
+                },
+            }
+        )
+        client.call(
+            "stripe_webhook",
+            "POST",
+            reverse("borrowing:payment-webhook"),
+            payload.encode(),
+            stripe_signature=sign_stripe_payload(payload, LOAD_WEBHOOK_SECRET),
+        )
+
+    def seed(self, books):
+        self.cleanup()
+        return [book.id for book in seed_books(books, LOAD_AUTHOR, 1000)]
+
+    def cleanup(self):
+        users = get_user_model().objects.filter(
+            email__startswith=LOAD_EMAIL_PREFIX,
+            email__endswith=LOAD_EMAIL_DOMAIN,
+        )
+        Notification.objects.filter(message__contains=LOAD_BOOK_TITLE).delete()
+        users.delete()
+        Book.objects.filter(author=LOAD_AUTHOR).delete()
+        StripeEvent.objects.filter(
+            event_id__startswith=LOAD_EVENT_PREFIX
+        ).delete()
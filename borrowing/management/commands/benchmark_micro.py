@@ -0,0 +1,253 @@
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import stripe
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from book.models import Book
+from book.serializers import BookDetailSerializer
+from borrowing.benchmarking import (
+    replace_attributes,
+    rolled_back,
+    seed_books,
+    seed_borrowings,
+    seed_users,
+)
+from borrowing.models import Borrowing, Payment
+from borrowing.payment_service import create_stripe_session
+from borrowing.serializers import BorrowingListSerializer
+from borrowing.views import BorrowingViewSet
+from library_service.stubs import StripeStub
+
+
+DEFAULT_OUTPUT = os.path.join(settings.BASE_DIR, "benchmarks", "micro.json")
+STRIPE_LINE_ITEMS = (1, 10)
+QUERYSET_PAGE_SIZE = 20
+
+
+def measure(function, repeat):
+    """Median wall time of ``function`` in ms and its query count."""
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "queries": len(queries),
+    }
+
+
+def borrowing_filters():
+    """Every combination of the ``BorrowingViewSet`` list filters."""
+    for is_staff, is_active, by_user in itertools.product(
+        (False, True), (None, "true", "false"), (False, True)
+    ):
+        name = f"staff={is_staff},is_active={is_active},user_id={by_user}"
+        yield name, is_staff, is_active, by_user
+
+
+def compare(baseline, results, threshold):
+    """Lines describing cases that got slower or ran different queries."""
+    regressions = []
+    for case, sizes in results.items():
+        for size, result in sizes.items():
+            before = baseline.get(case, {}).get(size)
+            if before is None:
+                continue
+            if result["queries"] != before["queries"]:
+                regressions.append(
+                    f"{case}[{size}]: {before['queries']} -> "
+                    f"{result['queries']} queries"
+                )
+            if result["median_ms"] > before["median_ms"] * (
+                1 + threshold / 100
+            ):
+                regressions.append(
+                    f"{case}[{size}]: {before['median_ms']} -> "
+                    f"{result['median_ms']} ms"
+                )
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the serializers, the borrowing list queryset under every "
+        "filter combination and Stripe session creation against a local "
+        "stub, over seeded datasets of each size, then roll back. Results "
+        "are stored as sorted JSON (benchmarks/micro.json by default) so "
+        "regressions show up in its diff; --compare also reports them "
+        "against the stored file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 10_000],
+            help="Borrowings to seed for each run.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--stripe-latency",
+            type=float,
+            default=0.0,
+            help="Seconds the Stripe stub waits before answering.",
+        )
+        parser.add_argument("--output", default=DEFAULT_OUTPUT)
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help="Report regressions against the stored results before "
+            "overwriting them.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20,
+            help="Slowdown in percent reported by --compare.",
+        )
+
+    def seed(self, size, rng):
+        today = date.today()
+        users = seed_users(
+            f"micro-{number}@library.test"
+            for number in range(max(1, size // 10))
+        )
+        books = seed_books(max(1, size // 10), "Micro benchmark")
+        seed_borrowings(
+            (
+                Borrowing(
+                    user=rng.choice(users),
+                    # The first book is borrowed every time, for the
+                    # detail serializer's slug list.
+                    book=books[0] if number % 2 else rng.choice(books),
+                    expected_return_date=today + timedelta(days=7),
+                    actual_return_date=(today if rng.random() < 0.5 else None),
+                )
+                for number in range(size)
+            ),
+            Payment.StatusChoices.PENDING,
+        )
+        return users, books
+
+    def run_size(self, size, options):
+        rng = random.Random(options["seed"])
+        repeat = options["repeat"]
+        users, books = self.seed(size, rng)
+        results = {}
+
+        borrowings = list(
+            Borrowing.objects.select_related("book", "user")
+            .prefetch_related("payments")
+            .with_prices()
+            .order_by("-id")
+        )
+        results["borrowing_list_serializer"] = measure(
+            lambda: BorrowingListSerializer(borrowings, many=True).data,
+            repeat,
+        )
+
+        book = Book.objects.get(pk=books[0].pk)
+        results["book_detail_serializer"] = measure(
+            lambda: BookDetailSerializer(book).data, repeat
+        )
+
+        factory = APIRequestFactory()
+        staff = get_user_model()(id=0, email="staff@library.test")
+        staff.is_staff = True
+        for name, is_staff, is_active, by_user in borrowing_filters():
+            params = {}
+            if is_active is not None:
+                params["is_active"] = is_active
+            if by_user:
+                params["user_id"] = users[0].id
+            request = Request(factory.get("/", params))
+            request.user = staff if is_staff else users[0]
+            view = BorrowingViewSet(
+                request=request, action="list", format_kwarg=None
+            )
+            results[f"borrowing_queryset[{name}]"] = measure(
+                lambda: list(
+                    view.get_queryset().order_by("-id")[:QUERYSET_PAGE_SIZE]
+                ),
+                repeat,
+            )
+
+        return results
+
+    def run_stripe(self, options):
+        results = {}
+        with StripeStub(latency=options["stripe_latency"]) as stub:
+            with replace_attributes(stripe, api_base=stub.url, api_key="sk"):
+                for items in STRIPE_LINE_ITEMS:
+                    with rolled_back():
+                        _, books = self.seed(
+                            items, random.Random(options["seed"])
+                        )
+                        payments = list(
+                            Payment.objects.select_related("borrowing__book")
+                            .filter(borrowing__book__in=books)
+                            .order_by("id")
+                        )
+                        results[str(items)] = measure(
+                            lambda: create_stripe_session(
+                                payments, "http://success", "http://cancel"
+                            ),
+                            options["repeat"],
+                        )
+        return results
+
+    def handle(self, *args, **options):
+        results = {}
+        for size in options["sizes"]:
+            with rolled_back():
+                for case, result in self.run_size(size, options).items():
+                    results.setdefault(case, {})[str(size)] = result
+
+        results["create_stripe_session"] = self.run_stripe(options)
+
+        for case, sizes in results.items():
+            timings = ", ".join(
+                f"{size}: {result['median_ms']} ms/{result['queries']}q"
+                for size, result in sizes.items()
+            )
+            self.stdout.write(f"{case}: {timings}")
+
+        output = options["output"]
+        if options["compare"] and os.path.exists(output):
+            with open(output) as stored:
+                baseline = json.load(stored)["results"]
+            regressions = compare(baseline, results, options["threshold"])
+            for regression in regressions:
+                self.stdout.write(f"Regression: {regression}")
+            if not regressions:
+                self.stdout.write("No regressions.")
+
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as stored:
+            json.dump(
+                {
+                    "sizes": options["sizes"],
+                    "repeat": options["repeat"],
+                    "results": results,
+                },
+                stored,
+                indent=2,
+                sort_keys=True,
+            )
+            stored.write("\n")
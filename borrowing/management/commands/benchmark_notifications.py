@@ -0,0 +1,67 @@
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from borrowing.notification_service import TelegramClient
+from library_service.stubs import TelegramStub
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Telegram delivery throughput of one request per message "
+        "against the pooled client, using a local Bot API stub."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.005,
+            help="Seconds the stub waits before answering each message.",
+        )
+        parser.add_argument("--concurrency", type=int, default=4)
+
+    def report(self, label, stub, elapsed, count):
+        self.stdout.write(
+            f"{label}: {count} messages in {elapsed:.2f}s "
+            f"({count / elapsed:.0f} msg/s), "
+            f"{stub.connections} connections"
+        )
+
+    def handle(self, *args, **options):
+        messages = [
+            f"Benchmark message #{number}"
+            for number in range(options["messages"])
+        ]
+
+        with TelegramStub(latency=options["latency"]) as stub:
+            api_url = f"{stub.url}/botTOKEN/sendMessage"
+            started = time.perf_counter()
+            for message in messages:
+                requests.post(
+                    api_url, json={"chat_id": "chat", "text": message}
+                )
+            self.report(
+                "before (requests.post)",
+                stub,
+                time.perf_counter() - started,
+                len(messages),
+            )
+
+        with TelegramStub(latency=options["latency"]) as stub:
+            client = TelegramClient(
+                bot_token="TOKEN",
+                chat_id="chat",
+                api_base=stub.url,
+                max_concurrency=options["concurrency"],
+            )
+            started = time.perf_counter()
+            client.send_messages(messages)
+            self.report(
+                "after (pooled client)",
+                stub,
+                time.perf_counter() - started,
+                len(messages),
+            )
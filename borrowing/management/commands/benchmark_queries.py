@@ -0,0 +1,113 @@
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from borrowing.benchmarking import (
+    rolled_back,
+    seed_books,
+    seed_borrowings,
+    seed_users,
+)
+from borrowing.models import Borrowing, Payment
+
+
+def hot_queries(user):
+    """The filters behind the busiest borrowing and payment code paths."""
+    tomorrow = date.today() + timedelta(days=1)
+    active = Borrowing.objects.filter(actual_return_date=None)
+
+    return {
+        "pending_payment_check": Payment.objects.filter(
+            borrowing__user=user, status=Payment.StatusChoices.PENDING
+        ).values("id")[:1],
+        "user_borrowings": Borrowing.objects.filter(user=user).order_by("-id")[
+            :20
+        ],
+        "user_active_borrowings": active.filter(user=user).order_by("-id")[
+            :20
+        ],
+        "all_active_borrowings": active.order_by("-id")[:20],
+        "overdue_scan": active.filter(expected_return_date__lte=tomorrow)
+        .order_by("expected_return_date", "id")
+        .values_list("id", "user__email", "book__title"),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large borrowing dataset inside a transaction, EXPLAIN and "
+        "time the hot borrowing/payment queries, then roll back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--books", type=int, default=500)
+        parser.add_argument("--borrowings", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output", help="Write the timings to this JSON file."
+        )
+
+    def seed(self, options):
+        rng = random.Random(options["seed"])
+        today = date.today()
+
+        users = seed_users(
+            f"bench{number}@library.test" for number in range(options["users"])
+        )
+        books = seed_books(options["books"], "Benchmark")
+
+        borrowings = []
+        for _ in range(options["borrowings"]):
+            due = today + timedelta(days=rng.randint(-60, 30))
+            returned = rng.random() < 0.8
+            borrowings.append(
+                Borrowing(
+                    user=rng.choice(users),
+                    book=rng.choice(books),
+                    expected_return_date=due,
+                    actual_return_date=due if returned else None,
+                )
+            )
+        seed_borrowings(
+            borrowings,
+            lambda borrowing: (
+                Payment.StatusChoices.PENDING
+                if rng.random() < 0.02
+                else Payment.StatusChoices.PAID
+            ),
+            money_to_pay=1,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return users
+
+    def handle(self, *args, **options):
+        results = {}
+        with rolled_back():
+            users = self.seed(options)
+            for name, queryset in hot_queries(users[0]).items():
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    list(queryset.all())
+                    timings.append((time.perf_counter() - started) * 1000)
+                plan = queryset.explain()
+                results[name] = {
+                    "median_ms": round(statistics.median(timings), 3),
+                    "plan": plan,
+                }
+                self.stdout.write(
+                    f"{name}: {results[name]['median_ms']} ms\n{plan}\n"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
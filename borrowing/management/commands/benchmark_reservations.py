@@ -0,0 +1,94 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from book.models import Book
+from borrowing.inventory import reserve_book
+
+
+def naive_reserve_book(book_id):
+    """The old read-check-write reservation, kept for comparison."""
+    book = Book.objects.get(pk=book_id)
+    if book.inventory == 0:
+        return False
+    book.inventory -= 1
+    book.save()
+    return True
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer one book with concurrent reservations and report "
+        "throughput and oversold copies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--attempts", type=int, default=200)
+        parser.add_argument("--inventory", type=int, default=1000)
+        parser.add_argument(
+            "--naive",
+            action="store_true",
+            help="Use read-check-write reservation instead of the "
+            "conditional UPDATE.",
+        )
+
+    def handle(self, *args, **options):
+        reserve = naive_reserve_book if options["naive"] else reserve_book
+        book = Book.objects.create(
+            title="Benchmark book",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=options["inventory"],
+            daily_fee=1,
+        )
+        counts = {"reserved": 0, "rejected": 0, "errors": 0}
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(options["threads"])
+
+        def worker():
+            local = {"reserved": 0, "rejected": 0, "errors": 0}
+            start_barrier.wait()
+            try:
+                for _ in range(options["attempts"]):
+                    try:
+                        with transaction.atomic():
+                            reserved = reserve(book.id)
+                    except OperationalError:
+                        local["errors"] += 1
+                        continue
+                    local["reserved" if reserved else "rejected"] += 1
+            finally:
+                connection.close()
+            with lock:
+                for key, value in local.items():
+                    counts[key] += value
+
+        threads = [
+            threading.Thread(target=worker) for _ in range(options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        book.refresh_from_db()
+        book.delete()
+
+        attempts = options["threads"] * options["attempts"]
+        oversold = counts["reserved"] - (options["inventory"] - book.inventory)
+
+        self.stdout.write(
+            f"mode: {'naive' if options['naive'] else 'conditional update'}\n"
+            f"attempts: {attempts} in {elapsed:.2f}s "
+            f"({attempts / elapsed:.0f} req/s)\n"
+            f"reserved: {counts['reserved']}, "
+            f"rejected: {counts['rejected']}, "
+            f"db errors: {counts['errors']}\n"
+            f"final inventory: {book.inventory}, "
+            f"oversold: {oversold}"
+        )
@@ -0,0 +1,123 @@
+import json
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from book.models import Book
+from book.serializers import BookListCreateSerializer
+from borrowing.benchmarking import (
+    rolled_back,
+    seed_books,
+    seed_borrowings,
+    seed_users,
+)
+from borrowing.models import Borrowing, Payment
+from borrowing.serializers import BorrowingListSerializer
+from library_service.fast_list import ValuesRowBuilder
+from library_service.renderers import OrjsonRenderer
+
+
+def serializer_render(serializer_class, queryset):
+    return JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+
+def values_render(serializer_class, queryset):
+    builder = ValuesRowBuilder(serializer_class())
+    return OrjsonRenderer().render(builder.build(builder.values(queryset)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed books and borrowings inside a transaction and compare the "
+        "time to render them with the DRF serializers and with the "
+        "values-based list path, then roll back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--output", help="Write the timings to this JSON file."
+        )
+
+    def seed(self, rows):
+        today = date.today()
+        (user,) = seed_users(["bench@library.test"])
+        seed_borrowings(
+            (
+                Borrowing(
+                    user=user,
+                    book=book,
+                    expected_return_date=today + timedelta(days=7),
+                )
+                for book in seed_books(rows, "Benchmark")
+            ),
+            Payment.StatusChoices.PAID,
+        )
+
+    def time_render(self, render, serializer_class, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = render(serializer_class, queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), content
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        cases = {
+            "books": (
+                BookListCreateSerializer,
+                lambda: Book.objects.order_by("id")[:rows],
+            ),
+            "borrowings": (
+                BorrowingListSerializer,
+                lambda: Borrowing.objects.select_related("book", "user")
+                .prefetch_related("payments")
+                .with_prices()
+                .order_by("-id")[:rows],
+            ),
+        }
+
+        results = {}
+        with rolled_back():
+            self.seed(rows)
+            for name, (serializer_class, queryset) in cases.items():
+                timings = {}
+                contents = set()
+                for label, render in (
+                    ("serializer", serializer_render),
+                    ("values", values_render),
+                ):
+                    median_ms, content = self.time_render(
+                        render,
+                        serializer_class,
+                        queryset(),
+                        options["repeat"],
+                    )
+                    timings[f"{label}_ms_per_10k"] = round(
+                        median_ms * 10_000 / rows, 3
+                    )
+                    contents.add(content)
+                if len(contents) != 1:
+                    raise CommandError(f"{name}: outputs differ.")
+
+                timings["speedup"] = round(
+                    timings["serializer_ms_per_10k"]
+                    / timings["values_ms_per_10k"],
+                    2,
+                )
+                results[name] = timings
+                self.stdout.write(
+                    f"{name}: serializer "
+                    f"{timings['serializer_ms_per_10k']} ms, values "
+                    f"{timings['values_ms_per_10k']} ms per 10k rows "
+                    f"({timings['speedup']}x)"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
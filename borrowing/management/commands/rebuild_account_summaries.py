@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from borrowing.account_summary import (
+    SUMMARY_FIELDS,
+    compute_account_summaries,
+    empty_summary,
+    refresh_account_summaries,
+)
+from user.models import AccountSummary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every account summary from the borrowing and payment "
+        "tables, or only compare them with --verify."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Report summaries that drifted instead of rewriting them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            self.verify(compute_account_summaries())
+        else:
+            self.rebuild()
+
+    def verify(self, expected):
+        stored = {
+            summary.user_id: {
+                field: getattr(summary, field) for field in SUMMARY_FIELDS
+            }
+            for summary in AccountSummary.objects.all()
+        }
+
+        mismatches = 0
+        for user_id in sorted(expected.keys() | stored.keys()):
+            actual = stored.get(user_id)
+            wanted = expected.get(user_id, empty_summary())
+            if actual is None and user_id not in expected:
+                continue
+            if actual != wanted:
+                mismatches += 1
+                self.stderr.write(
+                    f"User {user_id}: stored {actual}, expected {wanted}"
+                )
+
+        if mismatches:
+            raise CommandError(f"{mismatches} account summaries drifted.")
+        self.stdout.write(f"{len(stored)} account summaries are consistent.")
+
+    @transaction.atomic
+    def rebuild(self):
+        rebuilt = refresh_account_summaries()
+        self.stdout.write(f"Rebuilt {rebuilt} account summaries.")
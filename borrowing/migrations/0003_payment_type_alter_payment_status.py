@@ -0,0 +1,38 @@
+# Generated by Django 4.2.3 on 2023-07-05 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="payment",
+            old_name="type_session",
+            new_name="type",
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="type",
+            field=models.CharField(
+                choices=[("Payment", "Payment"), ("Fine", "Fine")],
+                max_length=50,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[("Pending", "Pending"), ("Paid", "Paid")],
+                max_length=50,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="borrowing",
+            name="actual_return_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
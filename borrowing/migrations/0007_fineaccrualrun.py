@@ -0,0 +1,32 @@
+# Generated by Django 4.2.3 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0006_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FineAccrualRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("started_at", models.DateTimeField()),
+                ("duration", models.FloatField(help_text="Seconds")),
+                ("processed", models.PositiveIntegerField()),
+                ("created", models.PositiveIntegerField()),
+                ("updated", models.PositiveIntegerField()),
+                ("rows_per_second", models.FloatField()),
+            ],
+        ),
+    ]
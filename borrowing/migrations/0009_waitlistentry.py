@@ -0,0 +1,86 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("book", "0003_book_updated_at"),
+        ("borrowing", "0008_borrowing_updated_at_payment_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WaitlistEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Waiting", "Waiting"),
+                            ("Held", "Held"),
+                            ("Claimed", "Claimed"),
+                            ("Expired", "Expired"),
+                        ],
+                        default="Waiting",
+                        max_length=50,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "hold_expires_at",
+                    models.DateTimeField(blank=True, null=True),
+                ),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="waitlist",
+                        to="book.book",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="waitlist",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "Waiting")),
+                        fields=["book", "id"],
+                        name="waitlist_queue_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("status", "Held")),
+                        fields=["hold_expires_at", "id"],
+                        name="waitlist_hold_expiry_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="waitlistentry",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["Waiting", "Held"])),
+                fields=("book", "user"),
+                name="waitlist_one_open_entry",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0010_notification_dead_letter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="session_renewals",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
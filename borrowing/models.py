@@ -1,7 +1,73 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from book.models import Book
+from user.models import User
+
+
+class DaysBetween(models.Func):
+    """Whole days from the second date expression to the first."""
+
+    arity = 2
+    template = "(%(expressions)s)"
+    arg_joiner = " - "
+    output_field = models.IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="DATEDIFF(%(expressions)s)",
+            arg_joiner=", ",
+            **extra_context,
+        )
+
+
+class BorrowingQuerySet(models.QuerySet):
+    def with_prices(self, as_of=None):
+        """Annotate ``total_amount`` and ``fine_amount`` computed in SQL.
+
+        Borrowings that are not returned yet are fined as if returned
+        on ``as_of`` (today by default), so the same annotation serves
+        returns, fine accrual and reports.
+        """
+        as_of = as_of or timezone.now().date()
+        amount = models.DecimalField(max_digits=8, decimal_places=2)
+        daily_fee = models.F("book__daily_fee")
+        returned = Coalesce(
+            "actual_return_date",
+            models.Value(as_of, output_field=models.DateField()),
+        )
 
-from books.models import Book
-from users.models import User
+        return self.annotate(
+            total_amount=models.ExpressionWrapper(
+                daily_fee * DaysBetween("expected_return_date", "borrow_date"),
+                output_field=amount,
+            ),
+            fine_amount=models.Case(
+                models.When(
+                    GreaterThan(returned, models.F("expected_return_date")),
+                    then=daily_fee
+                    * DaysBetween(returned, "expected_return_date")
+                    * 2,
+                ),
+                default=models.Value(Decimal("0")),
+                output_field=amount,
+            ),
+        )
 
 
 class Borrowing(models.Model):
@@ -14,6 +80,23 @@ class Borrowing(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="borrowings"
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = BorrowingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-id"],
+                condition=models.Q(actual_return_date=None),
+                name="borrowing_active_user_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=models.Q(actual_return_date=None),
+                name="borrowing_active_due_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email}: {self.book.title}"
@@ -21,14 +104,14 @@ class Borrowing(models.Model):
     @property
     def total_price(self):
         return (
-            self.book.dayle_fee
+            self.book.daily_fee
             * (self.expected_return_date - self.borrow_date).days
         )
 
     @property
     def fine_price(self):
         return (
-            self.book.dayle_fee
+            self.book.daily_fee
             * (self.actual_return_date - self.expected_return_date).days
         ) * 2
 
@@ -49,7 +132,127 @@ class Payment(models.Model):
     )
     session_url = models.URLField(null=True, blank=True)
     session_id = models.CharField(max_length=255, null=True, blank=True)
+    session_renewals = models.PositiveSmallIntegerField(default=0)
     money_to_pay = models.DecimalField(max_digits=8, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["borrowing"],
+                condition=models.Q(status="Pending"),
+                name="payment_pending_idx",
+            ),
+            models.Index(fields=["session_id"], name="payment_session_idx"),
+        ]
 
     def __str__(self):
         return f"Payment #{self.id}"
+
+
+class WaitlistEntry(models.Model):
+    """A user's place in the FIFO queue for an out-of-stock book.
+
+    Entries are served in ``id`` order. A returned copy is put on hold
+    for the head of the queue until ``hold_expires_at``, when
+    ``expire_waitlist_holds_task`` passes it on to the next user.
+    """
+
+    class StatusChoices(models.TextChoices):
+        WAITING = "Waiting"
+        HELD = "Held"
+        CLAIMED = "Claimed"
+        EXPIRED = "Expired"
+
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="waitlist"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="waitlist"
+    )
+    status = models.CharField(
+        max_length=50,
+        choices=StatusChoices.choices,
+        default=StatusChoices.WAITING,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "user"],
+                condition=models.Q(status__in=["Waiting", "Held"]),
+                name="waitlist_one_open_entry",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["book", "id"],
+                condition=models.Q(status="Waiting"),
+                name="waitlist_queue_idx",
+            ),
+            models.Index(
+                fields=["hold_expires_at", "id"],
+                condition=models.Q(status="Held"),
+                name="waitlist_hold_expiry_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Waitlist entry #{self.id}"
+
+
+class Notification(models.Model):
+    """Outbox of Telegram messages, written in the business transaction.
+
+    Rows are delivered by ``deliver_notifications_task`` and kept with
+    ``sent_at`` set once Telegram accepted them, or ``failed_at`` once
+    they ran out of attempts. ``next_attempt_at`` holds back rows that
+    are being sent or waiting out their retry backoff.
+    """
+
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sent_at=None, failed_at=None),
+                name="notification_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Notification #{self.id}"
+
+
+class StripeEvent(models.Model):
+    """Stripe webhook events that were already applied, by event id."""
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=255)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.event_id
+
+
+class FineAccrualRun(models.Model):
+    """Report of one ``accrue_fines_task`` run."""
+
+    started_at = models.DateTimeField()
+    duration = models.FloatField(help_text="Seconds")
+    processed = models.PositiveIntegerField()
+    created = models.PositiveIntegerField()
+    updated = models.PositiveIntegerField()
+    rows_per_second = models.FloatField()
+
+    def __str__(self):
+        return f"Fine accrual run #{self.id}"
@@ -1,17 +1,147 @@
-import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from dotenv import load_dotenv
+from django.conf import settings
+from django.db import transaction
+from django.utils.http import parse_http_date_safe
+from requests.adapters import HTTPAdapter
+
+from borrowing.models import Notification
+
+
+class TelegramClient:
+    """Long-lived Telegram Bot API client.
+
+    One ``requests.Session`` keeps a pool of keep-alive connections, so
+    messages after the first skip the TCP/TLS handshake. At most
+    ``max_concurrency`` requests are in flight at once; 429 responses
+    are retried after Telegram's ``retry_after`` and transient errors
+    after a jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        bot_token,
+        chat_id,
+        api_base="https://api.telegram.org",
+        max_concurrency=4,
+        max_retries=3,
+        timeout=(3.05, 10),
+        backoff_base=0.5,
+        backoff_cap=10,
+        max_retry_after=30,
+    ):
+        self.api_url = f"{api_base}/bot{bot_token}/sendMessage"
+        self.chat_id = chat_id
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_retry_after = max_retry_after
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _backoff(self, attempt):
+        return random.uniform(
+            0, min(self.backoff_cap, self.backoff_base * 2**attempt)
+        )
+
+    def _retry_after(self, response, attempt):
+        """Seconds to wait before retrying a 429 response.
+
+        Taken from Telegram's ``retry_after`` or the ``Retry-After``
+        header, in seconds or as an HTTP date, falling back to the usual
+        backoff when neither can be parsed.
+        """
+        try:
+            retry_after = response.json()["parameters"]["retry_after"]
+            if isinstance(retry_after, (int, float)) and retry_after >= 0:
+                return retry_after
+        except (ValueError, KeyError, TypeError):
+            pass
+
+        header = response.headers.get("Retry-After", "").strip()
+        if header.isdigit():
+            return int(header)
+        retry_at = parse_http_date_safe(header)
+        if retry_at is not None:
+            return max(0, retry_at - time.time())
+        return self._backoff(attempt)
+
+    def send_message(self, message):
+        payload = {"chat_id": self.chat_id, "text": message}
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                with self._slots:
+                    response = self.session.post(
+                        self.api_url, json=payload, timeout=self.timeout
+                    )
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 429 and not last_attempt:
+                retry_after = self._retry_after(response, attempt)
+                if retry_after > self.max_retry_after:
+                    response.raise_for_status()
+                time.sleep(retry_after)
+                continue
+
+            if response.status_code >= 500 and not last_attempt:
+                time.sleep(self._backoff(attempt))
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def send_messages(self, messages):
+        """Send several messages concurrently.
+
+        Returns one result per message, in order: the response, or the
+        exception that made the message fail.
+        """
+
+        def send(message):
+            try:
+                return self.send_message(message)
+            except requests.RequestException as error:
+                return error
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(send, messages))
+
+
+telegram_client = TelegramClient(
+    bot_token=settings.TELEGRAM_BOT_TOKEN,
+    chat_id=settings.TELEGRAM_CHAT_ID,
+    api_base=settings.TELEGRAM_API_BASE,
+)
 
 
 def send_telegram_message(message):
-    load_dotenv()
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    chat_id = os.getenv("TELEGRAM_CHAT_ID")
-    api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-    }
-    response = requests.post(api_url, json=payload)
-    return response
+    return telegram_client.send_message(message)
+
+
+def enqueue_notification(message):
+    """Store a Telegram message in the outbox of the current transaction.
+
+    Delivery is kicked off once the transaction commits; if the broker
+    is unreachable the periodic drain picks the message up later.
+    """
+    from borrowing.tasks import deliver_notifications_task
+
+    notification = Notification.objects.create(message=message)
+    transaction.on_commit(deliver_notifications_task.delay, robust=True)
+    return notification
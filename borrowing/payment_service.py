@@ -1,50 +1,252 @@
 import os
 
 import stripe
+from django.conf import settings
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from rest_framework.reverse import reverse
 
-from borrowings.models import Payment
+from borrowing.account_summary import adjust_account_summary
+from borrowing.models import Borrowing, Payment, StripeEvent
+from borrowing.notification_service import enqueue_notification
 
 
 stripe.api_key = os.getenv("STRIPE_KEY")
+stripe.api_base = settings.STRIPE_API_BASE
 
+STRIPE_SESSION_MAX_RENEWALS = 3
 
-@transaction.atomic
-def create_stripe_session(request, borrowing):
-    total_price = borrowing.total_price
-    unit_amount = int(total_price * 100)
 
-    payment = Payment.objects.create(
-        borrowing=borrowing,
-        status=Payment.StatusChoices.PENDING,
-        type=Payment.TypeChoices.PAYMENT,
-        money_to_pay=total_price,
+def create_payment(borrowing):
+    """Create the pending Payment for a borrowing, without calling Stripe.
+
+    The Stripe session is attached later by ``create_stripe_session``,
+    outside of the borrowing transaction. Until then the payment has no
+    ``session_url``, which is what clients poll for.
+    """
+    return create_payments([borrowing])[0]
+
+
+def create_payments(borrowings):
+    """Bulk version of ``create_payment`` for a multi-book checkout.
+
+    Amounts come from the ``with_prices`` annotation in one query, so
+    the borrowings do not need their books loaded.
+    """
+    amounts = dict(
+        Borrowing.objects.filter(
+            pk__in=[borrowing.pk for borrowing in borrowings]
+        )
+        .with_prices()
+        .values_list("pk", "total_amount")
+    )
+    return Payment.objects.bulk_create(
+        [
+            Payment(
+                borrowing=borrowing,
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.PAYMENT,
+                money_to_pay=amounts[borrowing.pk],
+            )
+            for borrowing in borrowings
+        ]
+    )
+
+
+def get_payment_urls(request, payment):
+    success_url = request.build_absolute_uri(
+        reverse("borrowing:payment_success", kwargs={"pk": payment.pk})
+    )
+    cancel_url = request.build_absolute_uri(
+        reverse("borrowing:payment_cancel", kwargs={"pk": payment.pk})
+    )
+    return success_url, cancel_url
+
+
+def get_default_payment_urls(payment_id):
+    """Payment redirect URLs built without a request."""
+    base_url = settings.PAYMENT_REDIRECT_BASE_URL.rstrip("/")
+    return tuple(
+        base_url + reverse(name, kwargs={"pk": payment_id})
+        for name in ("borrowing:payment_success", "borrowing:payment_cancel")
+    )
+
+
+def request_stripe_session_on_commit(
+    payment_ids, success_url=None, cancel_url=None
+):
+    """Queue a Checkout Session for the payments after the commit.
+
+    If the broker is unreachable the payments keep no session and are
+    picked up again later.
+    """
+    from borrowing.tasks import create_stripe_session_task
+
+    if not (success_url and cancel_url):
+        success_url, cancel_url = get_default_payment_urls(payment_ids[0])
+    transaction.on_commit(
+        lambda: create_stripe_session_task.delay(
+            payment_ids, success_url, cancel_url
+        ),
+        robust=True,
     )
 
+
+def create_stripe_session(payments, success_url, cancel_url):
+    """Open one Checkout Session paying for all given payments.
+
+    Every payment becomes a line item and all of them share the
+    session, so a multi-book checkout is paid in one go.
+    """
     session = stripe.checkout.Session.create(
         payment_method_types=["card"],
         line_items=[
             {
                 "price_data": {
                     "currency": "usd",
-                    "unit_amount": unit_amount,
+                    "unit_amount": int(payment.money_to_pay * 100),
                     "product_data": {
-                        "name": borrowing.book.title,
+                        "name": payment.borrowing.book.title,
                     },
                 },
                 "quantity": 1,
             }
+            for payment in payments
         ],
         mode="payment",
-        success_url=request.build_absolute_uri(
-            reverse("borrowings:payment_success", kwargs={"pk": payment.pk})
-        ),
-        cancel_url=request.build_absolute_uri(
-            reverse("borrowings:payment_cancel", kwargs={"pk": payment.pk})
+        success_url=success_url,
+        cancel_url=cancel_url,
+        # Retries of one attempt share the key; clearing an expired
+        # session bumps ``updated_at`` so the next attempt gets a new one.
+        idempotency_key=(
+            f"payment-{payments[0].pk}-"
+            f"{payments[0].updated_at:%Y%m%d%H%M%S%f}"
         ),
     )
 
-    payment.session_url = session.url
-    payment.session_id = session.id
-    payment.save()
+    Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+        session_url=session.url,
+        session_id=session.id,
+        updated_at=timezone.now(),
+    )
+    for payment in payments:
+        payment.session_url = session.url
+        payment.session_id = session.id
+    return session
+
+
+def _checkout_session_completed(session):
+    if session["payment_status"] != "paid":
+        return
+
+    payments = list(
+        Payment.objects.select_related("borrowing__user", "borrowing__book")
+        .filter(session_id=session["id"], status=Payment.StatusChoices.PENDING)
+        .order_by("id")
+    )
+    if not payments:
+        return
+
+    Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+        status=Payment.StatusChoices.PAID, updated_at=timezone.now()
+    )
+
+    paid_by_user = {}
+    for payment in payments:
+        count, total = paid_by_user.get(payment.borrowing.user_id, (0, 0))
+        paid_by_user[payment.borrowing.user_id] = (
+            count + 1,
+            total + payment.money_to_pay,
+        )
+    for user_id, (count, total) in paid_by_user.items():
+        adjust_account_summary(
+            user_id, pending_payments=-count, outstanding_balance=-total
+        )
+
+    for payment in payments:
+        enqueue_notification(
+            f"Payment #{payment.id} was successful.\n"
+            f"Type: {payment.type}\n"
+            f"Borrowing: {payment.borrowing}"
+        )
+
+
+def _checkout_session_expired(session):
+    """Detach the expired session and open a new one for the payments.
+
+    Sessions are renewed at most ``STRIPE_SESSION_MAX_RENEWALS`` times,
+    so an abandoned payment doesn't cycle through sessions forever;
+    after that the payer asks for a new one with ``renew_session``.
+    """
+    payments = Payment.objects.filter(
+        session_id=session["id"], status=Payment.StatusChoices.PENDING
+    )
+    renewable = list(
+        payments.filter(session_renewals__lt=STRIPE_SESSION_MAX_RENEWALS)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    payments.exclude(pk__in=renewable).update(
+        session_id=None, session_url=None, updated_at=timezone.now()
+    )
+    if not renewable:
+        return
+
+    Payment.objects.filter(pk__in=renewable).update(
+        session_id=None,
+        session_url=None,
+        session_renewals=F("session_renewals") + 1,
+        updated_at=timezone.now(),
+    )
+    request_stripe_session_on_commit(
+        renewable, session.get("success_url"), session.get("cancel_url")
+    )
+
+
+def renew_session(payment, success_url, cancel_url):
+    """Open a new session for a pending payment the payer came back to.
+
+    Resets the renewal count, since the payer is evidently still there.
+    """
+    Payment.objects.filter(pk=payment.pk).update(
+        session_renewals=0, updated_at=timezone.now()
+    )
+    request_stripe_session_on_commit([payment.pk], success_url, cancel_url)
+
+
+STRIPE_EVENT_HANDLERS = {
+    "checkout.session.completed": _checkout_session_completed,
+    "checkout.session.expired": _checkout_session_expired,
+}
+
+
+def construct_stripe_event(payload, signature):
+    """Verify a webhook signature and return the parsed event.
+
+    Raises ``ValueError`` for malformed payloads and
+    ``stripe.error.SignatureVerificationError`` for bad signatures.
+    """
+    return stripe.Webhook.construct_event(
+        payload, signature, settings.STRIPE_WEBHOOK_SECRET
+    )
+
+
+@transaction.atomic
+def handle_stripe_event(event):
+    """Apply a verified Stripe event exactly once.
+
+    The event id is recorded in the same transaction as its effects, so
+    a redelivered event costs a single indexed lookup and is ignored.
+    Returns False for duplicates.
+    """
+    _, created = StripeEvent.objects.get_or_create(
+        event_id=event["id"], defaults={"type": event["type"]}
+    )
+    if not created:
+        return False
+
+    handler = STRIPE_EVENT_HANDLERS.get(event["type"])
+    if handler:
+        handler(event["data"]["object"])
+    return True
@@ -2,10 +2,29 @@ from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
 
-from books.serializers import BookSerializer
-from borrowings.models import Borrowing, Payment
-from borrowings.notification_service import send_telegram_message
-from borrowings.payment_service import create_stripe_session
+from book.models import Book
+from book.serializers import BookListCreateSerializer
+from borrowing.account_summary import (
+    adjust_account_summary,
+    get_account_summary,
+)
+from borrowing.inventory import reserve_book, reserve_books
+from borrowing.models import Borrowing, Payment, WaitlistEntry
+from borrowing.notification_service import enqueue_notification
+from borrowing.payment_service import (
+    create_payment,
+    create_payments,
+    get_payment_urls,
+    request_stripe_session_on_commit,
+)
+from borrowing.waitlist import allocate_copies, claim_holds, has_hold
+
+
+def validate_no_pending_payments(user):
+    if get_account_summary(user.id).pending_payments > 0:
+        raise serializers.ValidationError(
+            "You have pending payments. Cannot borrow a new book."
+        )
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -39,19 +58,12 @@ class BorrowingSerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "borrow_date", "actual_return_date", "user")
 
     def validate(self, attrs):
-        user = self.context["request"].user
-
-        if Payment.objects.filter(
-            borrowing__user=user, status=Payment.StatusChoices.PENDING
-        ).exists():
-            raise serializers.ValidationError(
-                "You have pending payments. Cannot borrow a new book."
-            )
-
+        validate_no_pending_payments(self.context["request"].user)
         return attrs
 
     def validate_book(self, book):
-        if book.inventory == 0:
+        user = self.context["request"].user
+        if book.inventory == 0 and not has_hold(user.id, book.id):
             raise serializers.ValidationError(
                 "Book is not available for borrowing."
             )
@@ -62,28 +74,148 @@ class BorrowingSerializer(serializers.ModelSerializer):
         book = validated_data["book"]
         user = self.context["request"].user
 
+        # A held copy is taken before any copy on the shelf.
+        if not claim_holds(user.id, [book.id]) and not reserve_book(book.id):
+            raise serializers.ValidationError(
+                {"book": "Book is not available for borrowing."}
+            )
+
         borrowing = Borrowing.objects.create(
             expected_return_date=validated_data["expected_return_date"],
             book=book,
-            user=user,
+            user_id=user.id,
         )
 
-        create_stripe_session(self.context["request"], borrowing)
-
-        book.inventory -= 1
-        book.save()
+        payment = create_payment(borrowing)
+        adjust_account_summary(
+            user.id,
+            active_borrowings=1,
+            pending_payments=1,
+            outstanding_balance=payment.money_to_pay,
+        )
+        success_url, cancel_url = get_payment_urls(
+            self.context["request"], payment
+        )
+        request_stripe_session_on_commit([payment.id], success_url, cancel_url)
 
         message = (
             f"New borrowing created:\nUser: {user.email}\nBook: {book.title}"
         )
-        send_telegram_message(message)
+        enqueue_notification(message)
 
         return borrowing
 
 
+class BorrowingCheckoutSerializer(serializers.Serializer):
+    MAX_BOOKS = 10
+
+    books = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=MAX_BOOKS,
+        write_only=True,
+    )
+    expected_return_date = serializers.DateField()
+    borrowings = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    payments = PaymentSerializer(many=True, read_only=True)
+
+    def validate_books(self, book_ids):
+        if len(set(book_ids)) != len(book_ids):
+            raise serializers.ValidationError(
+                "Each book can be borrowed only once per checkout."
+            )
+
+        books = Book.objects.in_bulk(book_ids)
+        missing = [book_id for book_id in book_ids if book_id not in books]
+        if missing:
+            raise serializers.ValidationError(f"Books not found: {missing}")
+
+        user = self.context["request"].user
+        unavailable = [
+            book.title
+            for book in books.values()
+            if book.inventory == 0 and not has_hold(user.id, book.id)
+        ]
+        if unavailable:
+            raise serializers.ValidationError(
+                f"Books not available for borrowing: {unavailable}"
+            )
+
+        return [books[book_id] for book_id in book_ids]
+
+    def validate(self, attrs):
+        validate_no_pending_payments(self.context["request"].user)
+        return attrs
+
+    @transaction.atomic
+    def create(self, validated_data):
+        books = validated_data["books"]
+        user = self.context["request"].user
+
+        held = claim_holds(user.id, [book.id for book in books])
+        if not reserve_books(
+            [book.id for book in books if book.id not in held]
+        ):
+            raise serializers.ValidationError(
+                {"books": "Some books are no longer available."}
+            )
+
+        borrowings = Borrowing.objects.bulk_create(
+            [
+                Borrowing(
+                    expected_return_date=validated_data[
+                        "expected_return_date"
+                    ],
+                    book=book,
+                    user_id=user.id,
+                )
+                for book in books
+            ]
+        )
+
+        payments = create_payments(borrowings)
+        adjust_account_summary(
+            user.id,
+            active_borrowings=len(borrowings),
+            pending_payments=len(payments),
+            outstanding_balance=sum(
+                payment.money_to_pay for payment in payments
+            ),
+        )
+        success_url, cancel_url = get_payment_urls(
+            self.context["request"], payments[0]
+        )
+        request_stripe_session_on_commit(
+            [payment.id for payment in payments], success_url, cancel_url
+        )
+
+        titles = "\n".join(f"Book: {book.title}" for book in books)
+        enqueue_notification(
+            f"New borrowings created:\nUser: {user.email}\n{titles}"
+        )
+
+        return {
+            "expected_return_date": validated_data["expected_return_date"],
+            "borrowings": borrowings,
+            "payments": payments,
+        }
+
+
 class BorrowingListSerializer(BorrowingSerializer):
-    book = BookSerializer(read_only=True)
+    book = BookListCreateSerializer(read_only=True)
     user = serializers.ReadOnlyField(source="user.email")
+    total_price = serializers.DecimalField(
+        source="total_amount", max_digits=8, decimal_places=2, read_only=True
+    )
+    fine_price = serializers.DecimalField(
+        source="fine_amount", max_digits=8, decimal_places=2, read_only=True
+    )
+
+    class Meta(BorrowingSerializer.Meta):
+        fields = BorrowingSerializer.Meta.fields + (
+            "total_price",
+            "fine_price",
+        )
 
 
 class BorrowingReturnSerializer(BorrowingSerializer):
@@ -101,21 +233,64 @@ class BorrowingReturnSerializer(BorrowingSerializer):
     @transaction.atomic
     def save(self, **kwargs):
         borrowing = self.instance
-        borrowing.actual_return_date = timezone.now().date()
-        borrowing.save()
+        today = timezone.now().date()
 
-        book = borrowing.book
-        book.inventory += 1
-        book.save()
+        returned = Borrowing.objects.filter(
+            pk=borrowing.pk, actual_return_date=None
+        ).update(actual_return_date=today, updated_at=timezone.now())
+        if not returned:
+            raise serializers.ValidationError("Book has already been returned")
 
-        if borrowing.actual_return_date > borrowing.expected_return_date:
-            fine_amount = borrowing.fine_price
+        borrowing.actual_return_date = today
+        allocate_copies(borrowing.book_id)
 
-            Payment.objects.create(
-                status=Payment.StatusChoices.PENDING,
-                type=Payment.TypeChoices.FINE,
+        if borrowing.actual_return_date > borrowing.expected_return_date:
+            fine_amount = borrowing.fine_amount
+            fine, created = Payment.objects.get_or_create(
                 borrowing=borrowing,
-                money_to_pay=fine_amount,
+                type=Payment.TypeChoices.FINE,
+                status=Payment.StatusChoices.PENDING,
+                defaults={"money_to_pay": fine_amount},
             )
+            accrued = 0 if created else fine.money_to_pay
+            if not created:
+                fine.money_to_pay = fine_amount
+                fine.save(update_fields=["money_to_pay"])
+
+            adjust_account_summary(
+                borrowing.user_id,
+                active_borrowings=-1,
+                pending_payments=int(created),
+                outstanding_balance=fine_amount - accrued,
+            )
+        else:
+            adjust_account_summary(borrowing.user_id, active_borrowings=-1)
 
         return borrowing
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WaitlistEntry
+        fields = ("id", "book", "status", "created_at", "hold_expires_at")
+        read_only_fields = ("id", "status", "created_at", "hold_expires_at")
+
+    def validate_book(self, book):
+        if book.inventory > 0:
+            raise serializers.ValidationError(
+                "Book is available, borrow it instead."
+            )
+
+        user = self.context["request"].user
+        if WaitlistEntry.objects.filter(
+            book=book,
+            user_id=user.id,
+            status__in=(
+                WaitlistEntry.StatusChoices.WAITING,
+                WaitlistEntry.StatusChoices.HELD,
+            ),
+        ).exists():
+            raise serializers.ValidationError(
+                "You are already on the waitlist for this book."
+            )
+        return book
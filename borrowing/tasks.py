@@ -1,27 +1,334 @@
+import time
 from datetime import date, timedelta
 
+import stripe
+from celery import shared_task
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 
-from borrowings.models import Borrowing
-from borrowings.notification_service import send_telegram_message
+from borrowing.account_summary import refresh_account_summaries
+from borrowing.models import (
+    Borrowing,
+    FineAccrualRun,
+    Notification,
+    Payment,
+)
+from borrowing.notification_service import telegram_client
+from borrowing.payment_service import (
+    STRIPE_SESSION_MAX_RENEWALS,
+    create_stripe_session,
+    get_default_payment_urls,
+)
+from borrowing.waitlist import expire_holds
 
 
+OVERDUE_CHUNK_SIZE = 2000
+DIGEST_MAX_LENGTH = 4096
+
+
+def build_digests(lines, header, max_length=DIGEST_MAX_LENGTH):
+    """Pack lines into messages of at most ``max_length`` characters."""
+    digest = header
+    for line in lines:
+        line = line[: max_length - len(header) - 1]
+        if len(digest) + len(line) + 1 > max_length:
+            yield digest
+            digest = header
+        digest = f"{digest}\n{line}"
+    if digest != header:
+        yield digest
+
+
+@shared_task
 def check_overdue_borrowings_task():
+    """Queue digest notifications about borrowings due by tomorrow.
+
+    Rows are streamed in chunks with their user and book joined in, and
+    digests are written to the outbox as soon as they are full, so
+    memory stays flat however many borrowings are overdue.
+    """
     today = date.today()
     tomorrow = today + timedelta(days=1)
 
-    overdue_borrowings = Borrowing.objects.filter(
-        expected_return_date__lte=tomorrow, actual_return_date=None
+    overdue_borrowings = (
+        Borrowing.objects.filter(
+            expected_return_date__lte=tomorrow, actual_return_date=None
+        )
+        .order_by("expected_return_date", "id")
+        .values_list(
+            "id", "expected_return_date", "user__email", "book__title"
+        )
+        .iterator(chunk_size=OVERDUE_CHUNK_SIZE)
+    )
+    lines = (
+        f"#{borrowing_id} due {due_date}: {email} - {title}"
+        for borrowing_id, due_date, email, title in overdue_borrowings
     )
 
-    if overdue_borrowings.exists():
-        for borrowing in overdue_borrowings:
-            message = (
-                f"Overdue borrowing:\n"
-                f"Borrowing ID: {borrowing.id}\n"
-                f"User: {borrowing.user.email}\n"
-                f"Book: {borrowing.book.title}"
-            )
-            send_telegram_message(message)
+    total = 0
+    for digest in build_digests(
+        lines, "Overdue borrowings:", DIGEST_MAX_LENGTH
+    ):
+        Notification.objects.create(message=digest)
+        total += digest.count("\n")
+
+    if total:
+        message = f"{total} borrowings overdue today."
     else:
         message = "No borrowings overdue today!"
-        send_telegram_message(message)
+    Notification.objects.create(message=message)
+
+    transaction.on_commit(deliver_notifications_task.delay, robust=True)
+    return total
+
+
+FINE_ACCRUAL_CHUNK_SIZE = 1000
+
+
+def _accrue_fines_chunk(rows):
+    """Upsert the pending fines of one chunk of overdue borrowings."""
+    fines = {borrowing_id: amount for borrowing_id, _, amount in rows}
+    existing = Payment.objects.filter(
+        borrowing_id__in=fines.keys(),
+        type=Payment.TypeChoices.FINE,
+        status=Payment.StatusChoices.PENDING,
+    ).only("id", "borrowing_id", "money_to_pay", "updated_at")
+
+    changed = []
+    now = timezone.now()
+    for payment in existing:
+        amount = fines.pop(payment.borrowing_id)
+        if payment.money_to_pay != amount:
+            payment.money_to_pay = amount
+            payment.updated_at = now
+            changed.append(payment)
+
+    Payment.objects.bulk_create(
+        [
+            Payment(
+                borrowing_id=borrowing_id,
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.FINE,
+                money_to_pay=amount,
+            )
+            for borrowing_id, amount in fines.items()
+        ]
+    )
+    Payment.objects.bulk_update(changed, ["money_to_pay", "updated_at"])
+    refresh_account_summaries({user_id for _, user_id, _ in rows})
+
+    return len(fines), len(changed)
+
+
+@shared_task
+def accrue_fines_task(as_of=None):
+    """Keep a pending fine up to date for every overdue open borrowing.
+
+    Fines are priced in SQL by ``with_prices`` and written per chunk
+    with one bulk insert and one bulk update, then the account summaries
+    of the affected users are refreshed. The run is recorded as a
+    ``FineAccrualRun`` whose values are also returned.
+    """
+    as_of = date.fromisoformat(as_of) if as_of else date.today()
+    started_at = timezone.now()
+    start = time.perf_counter()
+    processed = created = updated = 0
+
+    overdue_borrowings = (
+        Borrowing.objects.filter(
+            actual_return_date=None, expected_return_date__lt=as_of
+        )
+        .with_prices(as_of)
+        .order_by("id")
+        .values_list("id", "user_id", "fine_amount")
+    )
+
+    last_id = 0
+    while True:
+        rows = list(
+            overdue_borrowings.filter(id__gt=last_id)[:FINE_ACCRUAL_CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        with transaction.atomic():
+            chunk_created, chunk_updated = _accrue_fines_chunk(rows)
+        processed += len(rows)
+        created += chunk_created
+        updated += chunk_updated
+        last_id = rows[-1][0]
+
+    duration = time.perf_counter() - start
+    report = {
+        "started_at": started_at,
+        "duration": duration,
+        "processed": processed,
+        "created": created,
+        "updated": updated,
+        "rows_per_second": processed / duration if duration else 0.0,
+    }
+    FineAccrualRun.objects.create(**report)
+    report["started_at"] = started_at.isoformat()
+    return report
+
+
+@shared_task(
+    autoretry_for=(stripe.error.APIConnectionError, stripe.error.APIError),
+    retry_backoff=True,
+    max_retries=5,
+)
+def create_stripe_session_task(payment_ids, success_url, cancel_url):
+    payments = list(
+        Payment.objects.select_related("borrowing__book")
+        .filter(pk__in=payment_ids, session_id=None)
+        .order_by("id")
+    )
+    if not payments:
+        return
+
+    create_stripe_session(payments, success_url, cancel_url)
+
+
+STRIPE_SESSION_GRACE_PERIOD = timedelta(minutes=10)
+
+
+@shared_task
+def request_missing_stripe_sessions_task():
+    """Queue sessions for pending payments that never got one.
+
+    Covers payments whose session task was lost, e.g. because the broker
+    was down when the borrowing committed, but not those whose expired
+    sessions were already renewed ``STRIPE_SESSION_MAX_RENEWALS`` times.
+    The payments of one user are paid in a single session. Returns the
+    number of sessions queued.
+    """
+    missing = (
+        Payment.objects.filter(
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            session_id=None,
+            session_renewals__lt=STRIPE_SESSION_MAX_RENEWALS,
+            updated_at__lt=timezone.now() - STRIPE_SESSION_GRACE_PERIOD,
+        )
+        .order_by("id")
+        .values_list("id", "borrowing__user_id")
+    )
+
+    payment_ids_by_user = {}
+    for payment_id, user_id in missing.iterator():
+        payment_ids_by_user.setdefault(user_id, []).append(payment_id)
+
+    for payment_ids in payment_ids_by_user.values():
+        success_url, cancel_url = get_default_payment_urls(payment_ids[0])
+        create_stripe_session_task.delay(payment_ids, success_url, cancel_url)
+    return len(payment_ids_by_user)
+
+
+NOTIFICATION_BATCH_SIZE = 50
+NOTIFICATION_MAX_ATTEMPTS = 10
+NOTIFICATION_MAX_BACKOFF = 300
+NOTIFICATION_CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def _claim_notifications(now):
+    """Lease the next batch of due notifications to this worker.
+
+    Rows are locked with SKIP LOCKED (where supported) only while their
+    ``next_attempt_at`` is pushed past the claim timeout, so other
+    workers pass over them without a lock held during delivery, and a
+    worker that dies mid-batch releases them when the lease runs out.
+    """
+    with transaction.atomic():
+        batch = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(next_attempt_at=None) | Q(next_attempt_at__lte=now),
+                sent_at=None,
+                failed_at=None,
+            )
+            .order_by("id")[:NOTIFICATION_BATCH_SIZE]
+        )
+        Notification.objects.filter(
+            pk__in=[notification.pk for notification in batch]
+        ).update(next_attempt_at=now + NOTIFICATION_CLAIM_TIMEOUT)
+    return batch
+
+
+@shared_task(bind=True, max_retries=None)
+def deliver_notifications_task(self):
+    """Drain the notification outbox, retrying failed messages.
+
+    Each claimed batch is sent through the pooled client with bounded
+    concurrency. A failed message is held back with an exponential
+    backoff so later batches still go out, and is dead-lettered with
+    ``failed_at`` after ``NOTIFICATION_MAX_ATTEMPTS``. The task retries
+    itself when the earliest backoff ends.
+    """
+    retry_at = None
+
+    while True:
+        batch = _claim_notifications(timezone.now())
+        if not batch:
+            break
+
+        results = telegram_client.send_messages(
+            [notification.message for notification in batch]
+        )
+        now = timezone.now()
+        for notification, result in zip(batch, results):
+            notification.attempts += 1
+            notification.next_attempt_at = None
+            if not isinstance(result, Exception):
+                notification.sent_at = now
+                notification.last_error = ""
+            elif notification.attempts >= NOTIFICATION_MAX_ATTEMPTS:
+                notification.failed_at = now
+                notification.last_error = str(result)
+            else:
+                notification.next_attempt_at = now + timedelta(
+                    seconds=min(
+                        2**notification.attempts, NOTIFICATION_MAX_BACKOFF
+                    )
+                )
+                notification.last_error = str(result)
+                retry_at = min(
+                    retry_at or notification.next_attempt_at,
+                    notification.next_attempt_at,
+                )
+
+        Notification.objects.bulk_update(
+            batch,
+            [
+                "attempts",
+                "sent_at",
+                "failed_at",
+                "next_attempt_at",
+                "last_error",
+            ],
+        )
+
+    if retry_at:
+        countdown = (retry_at - timezone.now()).total_seconds()
+        raise self.retry(countdown=max(countdown, 0))
+
+
+WAITLIST_SWEEP_BATCH_SIZE = 500
+
+
+@shared_task
+def expire_waitlist_holds_task():
+    """Expire unclaimed waitlist holds and pass their copies on.
+
+    Holds are expired in batches of ``WAITLIST_SWEEP_BATCH_SIZE``, each
+    in its own transaction, with the copies of a batch handed to the
+    next users in line per book or put back on the shelf.
+    """
+    now = timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            expired = expire_holds(now, WAITLIST_SWEEP_BATCH_SIZE)
+        total += expired
+        if expired < WAITLIST_SWEEP_BATCH_SIZE:
+            break
+    return total
@@ -1,8 +1,20 @@
+import io
+import json
 import os
+import tempfile
+import time
 
+import requests
+import stripe
 import telegram
+from asgiref.sync import async_to_sync
+from celery.exceptions import Retry
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from unittest.mock import patch
 
@@ -10,15 +22,45 @@ from dotenv import load_dotenv
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from django.utils import timezone
+from django.utils.http import http_date
 from datetime import timedelta
+from book.cache import get_catalog_version
+from book.inventory_stream import read_inventory_events
 from book.models import Book
-from borrowing.models import Borrowing, Payment
+from borrowing.inventory import reserve_book
+from borrowing.models import (
+    Borrowing,
+    FineAccrualRun,
+    Notification,
+    Payment,
+    StripeEvent,
+    WaitlistEntry,
+)
+from borrowing.notification_service import TelegramClient
+from borrowing.payment_service import STRIPE_SESSION_MAX_RENEWALS
+from borrowing.serializers import BorrowingCheckoutSerializer
+from borrowing.tasks import (
+    NOTIFICATION_MAX_ATTEMPTS,
+    accrue_fines_task,
+    build_digests,
+    check_overdue_borrowings_task,
+    create_stripe_session_task,
+    deliver_notifications_task,
+    expire_waitlist_holds_task,
+    request_missing_stripe_sessions_task,
+)
+from library_service.stubs import (
+    StripeStub,
+    TelegramStub,
+    sign_stripe_payload,
+)
+from user.models import AccountSummary
 
 load_dotenv()
 BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 bot = telegram.Bot(token=BOT_TOKEN)
-BORROWING_BOOK = reverse("borrowing_service:borrowings-list")
+BORROWING_BOOK = reverse("borrowing:borrowing-list")
 
 
 def sample_book(**params):
@@ -216,7 +258,9 @@ class BorrowingModelTestCase(TestCase):
             "book": book.id,
         }
         borrowing = Borrowing.objects.last()
-        url = reverse("borrowing_service:borrowings-return", args=[borrowing.id])
+        url = reverse(
+            "borrowing_service:borrowings-return", args=[borrowing.id]
+        )
         self.client.force_authenticate(user=self.user)
         self.client.post(url, data=payload2)
 
@@ -265,3 +309,1408 @@ class PaymentTestCase(APITestCase):
         response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["status"], Payment.STATUS_CHOICES[0][0])
+
+
+class BorrowingPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        book = sample_book()
+        self.borrowings = [
+            Borrowing.objects.create(
+                user=self.user,
+                book=book,
+                expected_return_date=timezone.now().date()
+                + timedelta(days=14),
+            )
+            for _ in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_is_cursor_paginated_newest_first(self):
+        res = self.client.get(BORROWING_BOOK, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertEqual(
+            [borrowing["id"] for borrowing in res.data["results"]],
+            [self.borrowings[2].id, self.borrowings[1].id],
+        )
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual(
+            [borrowing["id"] for borrowing in res.data["results"]],
+            [self.borrowings[0].id],
+        )
+        self.assertIsNone(res.data["next"])
+
+
+@patch("borrowing.tasks.deliver_notifications_task.delay")
+@patch("borrowing.tasks.create_stripe_session_task")
+class InventoryReservationTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.payload = {
+            "expected_return_date": timezone.now().date() + timedelta(days=14),
+        }
+
+    def test_reserve_book_stops_at_zero(self, *mocks):
+        book = sample_book(inventory=2)
+
+        self.assertTrue(reserve_book(book.id))
+        self.assertTrue(reserve_book(book.id))
+        self.assertFalse(reserve_book(book.id))
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    @patch(
+        "borrowing.serializers.BorrowingSerializer.validate_book",
+        side_effect=lambda book: book,
+    )
+    def test_create_fails_cleanly_when_stock_ran_out(self, *mocks):
+        book = sample_book(inventory=0)
+
+        res = self.client.post(
+            BORROWING_BOOK, {"book": book.id, **self.payload}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_borrow_and_return_invalidate_catalog_cache(self, *mocks):
+        book = sample_book(inventory=1)
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                BORROWING_BOOK, {"book": book.id, **self.payload}
+            )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(get_catalog_version(), version)
+
+        version = get_catalog_version()
+        url = reverse("borrowing:borrowing-book-return", args=[res.data["id"]])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        self.assertGreater(get_catalog_version(), version)
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 1)
+
+    def test_borrow_and_return_publish_inventory_deltas(self, *mocks):
+        book = sample_book(inventory=1)
+        cache.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                BORROWING_BOOK, {"book": book.id, **self.payload}
+            )
+        url = reverse("borrowing:borrowing-book-return", args=[res.data["id"]])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+
+        self.assertEqual(
+            async_to_sync(read_inventory_events)(0, 2),
+            [
+                (1, [{"id": book.id, "delta": -1}]),
+                (2, [{"id": book.id, "delta": 1}]),
+            ],
+        )
+
+    def test_return_is_applied_once(self, *mocks):
+        book = sample_book(inventory=1)
+        borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=book,
+            expected_return_date=self.payload["expected_return_date"],
+        )
+        url = reverse("borrowing:borrowing-book-return", args=[borrowing.id])
+
+        self.client.post(url)
+        res = self.client.post(url)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 2)
+
+
+class StripeSessionTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = sample_book(title="Dune", daily_fee=2)
+        self.payload = {
+            "book": self.book.id,
+            "expected_return_date": timezone.now().date() + timedelta(days=3),
+        }
+
+    @patch("borrowing.tasks.deliver_notifications_task.delay")
+    @patch("borrowing.tasks.create_stripe_session_task.delay")
+    def test_session_is_requested_after_commit(self, mock_delay, _):
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(BORROWING_BOOK, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        payment = Payment.objects.get(borrowing_id=res.data["id"])
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+        self.assertEqual(payment.money_to_pay, 6)
+        self.assertIsNone(payment.session_url)
+        mock_delay.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        mock_delay.assert_called_once()
+        self.assertEqual(mock_delay.call_args.args[0], [payment.id])
+
+    @patch("borrowing.tasks.deliver_notifications_task.delay")
+    @patch(
+        "borrowing.tasks.create_stripe_session_task.delay",
+        side_effect=OSError("broker unreachable"),
+    )
+    def test_broker_outage_is_swept_up_later(self, mock_delay, _):
+        with self.assertLogs("django.test", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(BORROWING_BOOK, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        payment = Payment.objects.get(borrowing_id=res.data["id"])
+        mock_delay.reset_mock(side_effect=True)
+        self.assertEqual(request_missing_stripe_sessions_task(), 0)
+
+        Payment.objects.update(
+            updated_at=timezone.now() - timedelta(minutes=30)
+        )
+        self.assertEqual(request_missing_stripe_sessions_task(), 1)
+        self.assertEqual(mock_delay.call_args.args[0], [payment.id])
+
+    def test_task_attaches_session_from_stripe(self):
+        with patch("borrowing.tasks.create_stripe_session_task"):
+            res = self.client.post(BORROWING_BOOK, self.payload)
+        payment = Payment.objects.get(borrowing_id=res.data["id"])
+
+        with StripeStub() as stub, patch.multiple(
+            stripe, api_base=stub.url, api_key="sk_test"
+        ):
+            create_stripe_session_task(
+                [payment.id], "http://test/success", "http://test/cancel"
+            )
+            create_stripe_session_task(
+                [payment.id], "http://test/success", "http://test/cancel"
+            )
+
+        payment.refresh_from_db()
+        self.assertIn(payment.session_id, stub.sessions)
+        self.assertEqual(
+            payment.session_url, stub.sessions[payment.session_id]["url"]
+        )
+        self.assertEqual(len(stub.sessions), 1)
+        params = stub.sessions[payment.session_id]["params"]
+        self.assertEqual(
+            params["line_items[0][price_data][unit_amount]"], ["600"]
+        )
+
+        res = self.client.get(
+            reverse("borrowing:payment-detail", args=[payment.id])
+        )
+        self.assertEqual(res.data["session_id"], payment.session_id)
+
+
+class NotificationOutboxTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(user=self.user)
+
+    @patch("borrowing.tasks.create_stripe_session_task")
+    def test_borrowing_writes_outbox_row(self, _):
+        book = sample_book(title="Dune")
+        payload = {
+            "book": book.id,
+            "expected_return_date": timezone.now().date() + timedelta(days=3),
+        }
+
+        with patch(
+            "borrowing.tasks.deliver_notifications_task.delay"
+        ) as mock_delay, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(BORROWING_BOOK, payload)
+
+        notification = Notification.objects.get()
+        self.assertIn("Book: Dune", notification.message)
+        self.assertIsNone(notification.sent_at)
+        mock_delay.assert_called_once_with()
+
+    @patch("borrowing.tasks.telegram_client.send_message")
+    def test_deliver_marks_sent_messages(self, mock_send):
+        Notification.objects.create(message="first")
+        Notification.objects.create(message="second")
+
+        deliver_notifications_task()
+
+        self.assertCountEqual(
+            [call.args[0] for call in mock_send.call_args_list],
+            ["first", "second"],
+        )
+        self.assertFalse(Notification.objects.filter(sent_at=None).exists())
+
+    @patch("borrowing.tasks.telegram_client.send_message")
+    def test_deliver_keeps_failed_messages_for_retry(self, mock_send):
+        notification = Notification.objects.create(message="first")
+        mock_send.side_effect = requests.ConnectionError("telegram is down")
+
+        with self.assertRaises(Retry):
+            deliver_notifications_task()
+
+        notification.refresh_from_db()
+        self.assertIsNone(notification.sent_at)
+        self.assertEqual(notification.attempts, 1)
+        self.assertEqual(notification.last_error, "telegram is down")
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+
+        mock_send.side_effect = None
+        deliver_notifications_task()
+        self.assertEqual(mock_send.call_count, 1)
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        deliver_notifications_task()
+
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.sent_at)
+        self.assertEqual(notification.attempts, 2)
+
+    @patch("borrowing.tasks.NOTIFICATION_BATCH_SIZE", 1)
+    @patch("borrowing.tasks.telegram_client.send_message")
+    def test_failed_message_does_not_block_later_batches(self, mock_send):
+        Notification.objects.create(message="first")
+        Notification.objects.create(message="second")
+        mock_send.side_effect = [requests.ConnectionError("down"), None]
+
+        with self.assertRaises(Retry):
+            deliver_notifications_task()
+
+        self.assertEqual(
+            list(
+                Notification.objects.exclude(sent_at=None).values_list(
+                    "message", flat=True
+                )
+            ),
+            ["second"],
+        )
+
+    @patch("borrowing.tasks.telegram_client.send_message")
+    def test_message_is_dead_lettered_after_max_attempts(self, mock_send):
+        notification = Notification.objects.create(
+            message="first", attempts=NOTIFICATION_MAX_ATTEMPTS - 1
+        )
+        mock_send.side_effect = requests.ConnectionError("telegram is down")
+
+        deliver_notifications_task()
+        deliver_notifications_task()
+
+        notification.refresh_from_db()
+        self.assertIsNone(notification.sent_at)
+        self.assertIsNotNone(notification.failed_at)
+        self.assertEqual(notification.attempts, NOTIFICATION_MAX_ATTEMPTS)
+        self.assertEqual(mock_send.call_count, 1)
+
+
+class TelegramClientTestCase(TestCase):
+    def client_for(self, stub, **kwargs):
+        return TelegramClient(
+            bot_token="TOKEN", chat_id="chat", api_base=stub.url, **kwargs
+        )
+
+    def test_messages_share_keep_alive_connection(self):
+        with TelegramStub() as stub:
+            client = self.client_for(stub, max_concurrency=1)
+            for number in range(3):
+                client.send_message(f"message {number}")
+
+        self.assertEqual(stub.connections, 1)
+        self.assertEqual(
+            stub.messages, ["message 0", "message 1", "message 2"]
+        )
+
+    @patch("borrowing.notification_service.time.sleep")
+    def test_rate_limited_messages_wait_retry_after(self, mock_sleep):
+        with TelegramStub(rate_limit_every=2, retry_after=3) as stub:
+            results = self.client_for(stub).send_messages(
+                ["first", "second", "third"]
+            )
+
+        self.assertFalse(
+            [result for result in results if isinstance(result, Exception)]
+        )
+        self.assertCountEqual(stub.messages, ["first", "second", "third"])
+        mock_sleep.assert_called_with(3)
+
+    def test_retry_after_header_is_parsed_defensively(self):
+        client = TelegramClient(bot_token="TOKEN", chat_id="chat")
+
+        def retry_after(header):
+            response = requests.Response()
+            response.status_code = 429
+            response._content = b"Too Many Requests"
+            response.headers["Retry-After"] = header
+            return client._retry_after(response, attempt=0)
+
+        self.assertEqual(retry_after("7"), 7)
+        self.assertAlmostEqual(
+            retry_after(http_date(time.time() + 20)), 20, delta=2
+        )
+        self.assertEqual(retry_after(http_date(time.time() - 20)), 0)
+        self.assertLessEqual(retry_after("soon"), client.backoff_base)
+        self.assertLessEqual(retry_after("-5"), client.backoff_base)
+
+    @patch("borrowing.notification_service.time.sleep")
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        with TelegramStub(rate_limit_every=1) as stub:
+            with self.assertRaises(requests.HTTPError):
+                self.client_for(stub, max_retries=2).send_message("first")
+
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(stub.messages, [])
+
+
+@patch("borrowing.tasks.deliver_notifications_task.delay")
+class OverdueBorrowingsTaskTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.book = sample_book(title="Dune")
+        self.today = timezone.now().date()
+
+    def borrow(self, days, **params):
+        return Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=self.today + timedelta(days=days),
+            **params,
+        )
+
+    def test_build_digests_respects_max_length(self, _):
+        lines = [f"line {number}" for number in range(100)] + ["x" * 500]
+
+        digests = list(build_digests(lines, "Header:", max_length=100))
+
+        self.assertTrue(all(len(digest) <= 100 for digest in digests))
+        self.assertTrue(all(d.startswith("Header:\n") for d in digests))
+        body = [line for d in digests for line in d.split("\n")[1:]]
+        self.assertEqual(body[:100], lines[:100])
+        self.assertEqual(len(body), 101)
+
+    @patch("borrowing.tasks.DIGEST_MAX_LENGTH", 200)
+    def test_overdue_rows_are_streamed_into_digests(self, _):
+        overdue = [self.borrow(days=-3) for _ in range(20)]
+        self.borrow(days=5)
+        self.borrow(days=-3, actual_return_date=self.today)
+
+        with CaptureQueriesContext(connection) as queries:
+            total = check_overdue_borrowings_task()
+
+        selects = [q for q in queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(total, 20)
+
+        *digests, summary = Notification.objects.order_by("id")
+        self.assertGreater(len(digests), 1)
+        self.assertTrue(all(len(d.message) <= 200 for d in digests))
+        text = "\n".join(d.message for d in digests)
+        for borrowing in overdue:
+            self.assertIn(f"#{borrowing.id} ", text)
+        self.assertEqual(summary.message, "20 borrowings overdue today.")
+
+    def test_no_overdue_borrowings(self, _):
+        self.borrow(days=5)
+
+        self.assertEqual(check_overdue_borrowings_task(), 0)
+        self.assertEqual(
+            Notification.objects.get().message,
+            "No borrowings overdue today!",
+        )
+
+
+@patch("borrowing.tasks.deliver_notifications_task.delay")
+class BorrowingCheckoutTestCase(APITestCase):
+    CHECKOUT_URL = reverse("borrowing:borrowing-checkout")
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            sample_book(title=f"Book {number}", inventory=1, daily_fee=1)
+            for number in range(3)
+        ]
+        self.expected_return_date = timezone.now().date() + timedelta(days=2)
+
+    def checkout(self, books):
+        return self.client.post(
+            self.CHECKOUT_URL,
+            {
+                "books": [book.id for book in books],
+                "expected_return_date": self.expected_return_date,
+            },
+            format="json",
+        )
+
+    @patch("borrowing.tasks.create_stripe_session_task.delay")
+    def test_checkout_reserves_all_books_with_one_session(self, mock_delay, _):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.checkout(self.books)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        borrowings = Borrowing.objects.filter(user=self.user)
+        self.assertEqual(borrowings.count(), 3)
+        self.assertEqual(
+            sorted(res.data["borrowings"]),
+            sorted(borrowing.id for borrowing in borrowings),
+        )
+        self.assertFalse(
+            Book.objects.filter(
+                id__in=[book.id for book in self.books], inventory__gt=0
+            ).exists()
+        )
+
+        payments = Payment.objects.filter(borrowing__user=self.user)
+        self.assertEqual(
+            [payment.money_to_pay for payment in payments], [2, 2, 2]
+        )
+        mock_delay.assert_called_once()
+        self.assertEqual(
+            sorted(mock_delay.call_args.args[0]),
+            sorted(payment.id for payment in payments),
+        )
+        self.assertEqual(Notification.objects.count(), 1)
+
+    @patch("borrowing.tasks.create_stripe_session_task")
+    def test_checkout_is_all_or_nothing(self, *mocks):
+        Book.objects.filter(id=self.books[2].id).update(inventory=0)
+        books = self.books
+
+        with patch.object(
+            BorrowingCheckoutSerializer,
+            "validate_books",
+            lambda serializer, book_ids: books,
+        ):
+            res = self.checkout(self.books)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertEqual(
+            list(
+                Book.objects.order_by("id").values_list("inventory", flat=True)
+            ),
+            [1, 1, 0],
+        )
+
+    def test_checkout_rejects_duplicates_and_unavailable_books(self, _):
+        res = self.checkout([self.books[0], self.books[0]])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Book.objects.filter(id=self.books[1].id).update(inventory=0)
+        res = self.checkout(self.books)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Book 1", str(res.data["books"]))
+
+    def test_session_has_line_item_per_book(self, _):
+        with patch("borrowing.tasks.create_stripe_session_task"):
+            self.checkout(self.books)
+        payment_ids = list(Payment.objects.values_list("id", flat=True))
+
+        with StripeStub() as stub, patch.multiple(
+            stripe, api_base=stub.url, api_key="sk_test"
+        ):
+            create_stripe_session_task(
+                payment_ids, "http://test/success", "http://test/cancel"
+            )
+
+        (session,) = stub.sessions.values()
+        self.assertIn(
+            "line_items[2][price_data][unit_amount]", session["params"]
+        )
+        self.assertEqual(
+            set(Payment.objects.values_list("session_id", flat=True)),
+            {session["id"]},
+        )
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+@patch("borrowing.tasks.deliver_notifications_task.delay")
+class StripeWebhookTestCase(APITestCase):
+    WEBHOOK_URL = reverse("borrowing:payment-webhook")
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=sample_book(),
+            expected_return_date=timezone.now().date() + timedelta(days=3),
+        )
+        self.payments = [
+            Payment.objects.create(
+                borrowing=borrowing,
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.PAYMENT,
+                session_id="cs_test_1",
+                session_url="https://checkout.test/cs_test_1",
+                money_to_pay=6,
+            )
+            for _ in range(2)
+        ]
+
+    def send_event(self, event_type, event_id="evt_1", secret="whsec_test"):
+        payload = json.dumps(
+            {
+                "id": event_id,
+                "object": "event",
+                "type": event_type,
+                "data": {
+                    "object": {
+                        "id": "cs_test_1",
+                        "object": "checkout.session",
+                        "payment_status": "paid",
+                    }
+                },
+            }
+        )
+        return self.client.post(
+            self.WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=sign_stripe_payload(payload, secret),
+        )
+
+    def test_completed_session_marks_payments_paid(self, _):
+        res = self.send_event("checkout.session.completed")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(Payment.objects.values_list("status", flat=True)),
+            {Payment.StatusChoices.PAID},
+        )
+        self.assertEqual(Notification.objects.count(), 2)
+
+        self.client.force_authenticate(self.user)
+        res = self.client.get(
+            reverse("borrowing:payment_success", args=[self.payments[0].id])
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_duplicate_delivery_is_ignored(self, _):
+        self.send_event("checkout.session.completed")
+
+        with self.assertNumQueries(3):
+            res = self.send_event("checkout.session.completed")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_expired_session_is_detached(self, _):
+        self.send_event("checkout.session.expired")
+
+        payment = Payment.objects.get(id=self.payments[0].id)
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+        self.assertIsNone(payment.session_id)
+        self.assertIsNone(payment.session_url)
+
+    @patch("borrowing.tasks.create_stripe_session_task.delay")
+    def test_session_renewals_are_capped(self, mock_delay, _):
+        Payment.objects.update(session_renewals=STRIPE_SESSION_MAX_RENEWALS)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send_event("checkout.session.expired")
+
+        mock_delay.assert_not_called()
+        payment = Payment.objects.get(id=self.payments[0].id)
+        self.assertIsNone(payment.session_id)
+        Payment.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(request_missing_stripe_sessions_task(), 0)
+
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                reverse("borrowing:payment-renew-session", args=[payment.id])
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(mock_delay.call_args.args[0], [payment.id])
+        payment.refresh_from_db()
+        self.assertEqual(payment.session_renewals, 0)
+
+    def test_open_session_is_not_renewed(self, _):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.post(
+            reverse(
+                "borrowing:payment-renew-session", args=[self.payments[0].id]
+            )
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("borrowing.tasks.create_stripe_session_task.delay")
+    def test_expired_session_is_replaced_with_a_new_key(self, mock_delay, _):
+        Payment.objects.update(session_id=None, session_url=None)
+        with patch("stripe.checkout.Session.create") as mock_create:
+            mock_create.return_value.url = "https://checkout.test/cs_test_1"
+            mock_create.return_value.id = "cs_test_1"
+            create_stripe_session_task(
+                [payment.id for payment in self.payments],
+                "http://s",
+                "http://c",
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                self.send_event("checkout.session.expired")
+
+            mock_delay.assert_called_once()
+            payment_ids, success_url, _ = mock_delay.call_args.args
+            self.assertEqual(
+                payment_ids, [payment.id for payment in self.payments]
+            )
+            self.assertEqual(
+                success_url,
+                "http://localhost:8000"
+                + reverse("borrowing:payment_success", args=[payment_ids[0]]),
+            )
+
+            create_stripe_session_task(*mock_delay.call_args.args)
+
+        first, second = (
+            call.kwargs["idempotency_key"]
+            for call in mock_create.call_args_list
+        )
+        self.assertNotEqual(first, second)
+
+    def test_invalid_signature_is_rejected(self, _):
+        res = self.send_event("checkout.session.completed", secret="wrong")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+        self.assertEqual(
+            Payment.objects.get(id=self.payments[0].id).status,
+            Payment.StatusChoices.PENDING,
+        )
+
+    def test_success_url_before_webhook_reads_local_state(self, _):
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                reverse(
+                    "borrowing:payment_success", args=[self.payments[0].id]
+                )
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+
+class BenchmarkQueriesCommandTestCase(TestCase):
+    def test_reports_hot_queries_and_rolls_back(self):
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command(
+                "benchmark_queries",
+                users=5,
+                books=5,
+                borrowings=200,
+                repeat=1,
+                output=output.name,
+                stdout=io.StringIO(),
+            )
+            results = json.load(output)
+
+        self.assertIn("pending_payment_check", results)
+        self.assertIn(
+            "payment_pending_idx", results["pending_payment_check"]["plan"]
+        )
+        self.assertIn(
+            "borrowing_active_due_idx", results["overdue_scan"]["plan"]
+        )
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertFalse(Book.objects.exists())
+
+    def test_serializer_benchmark_compares_identical_output(self):
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command(
+                "benchmark_serializers",
+                rows=50,
+                repeat=1,
+                output=output.name,
+                stdout=io.StringIO(),
+            )
+            results = json.load(output)
+
+        self.assertEqual(set(results), {"books", "borrowings"})
+        self.assertIn("values_ms_per_10k", results["borrowings"])
+        self.assertFalse(Borrowing.objects.exists())
+
+    def test_micro_benchmarks_are_stored_and_compared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "micro.json")
+            for compare in (False, True):
+                out = io.StringIO()
+                call_command(
+                    "benchmark_micro",
+                    sizes=[10],
+                    repeat=1,
+                    output=output,
+                    compare=compare,
+                    threshold=10_000,
+                    stdout=out,
+                )
+            with open(output) as stored:
+                results = json.load(stored)["results"]
+
+        self.assertIn("No regressions.", out.getvalue())
+        self.assertEqual(
+            results["borrowing_list_serializer"]["10"]["queries"], 0
+        )
+        self.assertEqual(results["book_detail_serializer"]["10"]["queries"], 1)
+        self.assertEqual(
+            len(
+                [
+                    case
+                    for case in results
+                    if case.startswith("borrowing_queryset[")
+                ]
+            ),
+            12,
+        )
+        self.assertEqual(set(results["create_stripe_session"]), {"1", "10"})
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertFalse(Book.objects.exists())
+
+    def test_async_read_benchmark_reports_latency(self):
+        for server in ("wsgi", "asgi"):
+            out = io.StringIO()
+            call_command(
+                "benchmark_async_reads",
+                serve=server,
+                path=[reverse("book:book-list")],
+                requests=4,
+                concurrency=2,
+                stdout=out,
+            )
+            result = json.loads(out.getvalue())
+
+            self.assertEqual(result["requests"], 4)
+            self.assertEqual(result["errors"], 0)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+
+
+class LoadTestCommandTestCase(TransactionTestCase):
+    def test_refuses_to_write_to_a_shared_database(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_load", stdout=io.StringIO())
+
+        self.assertFalse(Book.objects.exists())
+
+    def test_journeys_are_reported_per_endpoint_and_cleaned_up(self):
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command(
+                "benchmark_load",
+                allow_writes=True,
+                users=2,
+                concurrency=1,
+                iterations=1,
+                browse=1,
+                books=3,
+                workers=0,
+                stripe_latency=0,
+                telegram_latency=0,
+                output=output.name,
+                stdout=io.StringIO(),
+            )
+            results = json.load(output)
+
+        self.assertEqual(
+            set(results["endpoints"]),
+            {
+                "register",
+                "token",
+                "book_list",
+                "book_detail",
+                "borrow",
+                "payment_detail",
+                "stripe_webhook",
+                "payment_success",
+                "return",
+            },
+        )
+        self.assertEqual(results["total"]["errors"], 0)
+        self.assertEqual(results["endpoints"]["borrow"]["requests"], 2)
+        self.assertLessEqual(
+            results["total"]["p50_ms"], results["total"]["p95_ms"]
+        )
+        self.assertEqual(results["stubs"]["stripe_sessions"], 2)
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+@patch("borrowing.tasks.deliver_notifications_task.delay")
+@patch("borrowing.tasks.create_stripe_session_task.delay")
+class AccountSummaryTestCase(APITestCase):
+    SUMMARY_URL = reverse("user:summary")
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            sample_book(title=f"Book {number}", daily_fee=1)
+            for number in range(2)
+        ]
+
+    def checkout(self):
+        return self.client.post(
+            reverse("borrowing:borrowing-checkout"),
+            {
+                "books": [book.id for book in self.books],
+                "expected_return_date": timezone.now().date()
+                + timedelta(days=2),
+            },
+            format="json",
+        )
+
+    def complete_session(self, session_id):
+        payload = json.dumps(
+            {
+                "id": "evt_1",
+                "type": "checkout.session.completed",
+                "data": {
+                    "object": {"id": session_id, "payment_status": "paid"}
+                },
+            }
+        )
+        return self.client.post(
+            reverse("borrowing:payment-webhook"),
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=sign_stripe_payload(payload, "whsec_test"),
+        )
+
+    def summary(self):
+        return self.client.get(self.SUMMARY_URL).data
+
+    def test_summary_follows_checkout_return_and_payment(self, *_):
+        self.checkout()
+        self.assertEqual(
+            self.summary(),
+            {
+                "active_borrowings": 2,
+                "pending_payments": 2,
+                "outstanding_balance": "4.00",
+            },
+        )
+
+        borrowing = Borrowing.objects.filter(user=self.user).first()
+        self.client.post(
+            reverse("borrowing:borrowing-book-return", args=[borrowing.id])
+        )
+        self.assertEqual(self.summary()["active_borrowings"], 1)
+
+        Payment.objects.update(session_id="cs_test")
+        self.complete_session("cs_test")
+        self.assertEqual(
+            self.summary(),
+            {
+                "active_borrowings": 1,
+                "pending_payments": 0,
+                "outstanding_balance": "0.00",
+            },
+        )
+        call_command(
+            "rebuild_account_summaries", verify=True, stdout=io.StringIO()
+        )
+
+    def test_pending_payment_blocks_new_borrowing(self, *_):
+        self.checkout()
+
+        res = self.client.post(
+            BORROWING_BOOK,
+            {
+                "book": sample_book().id,
+                "expected_return_date": timezone.now().date()
+                + timedelta(days=2),
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.summary()["active_borrowings"], 2)
+
+    def test_summary_is_built_for_existing_activity(self, *_):
+        borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.books[0],
+            expected_return_date=timezone.now().date() + timedelta(days=2),
+        )
+        Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            money_to_pay=4,
+        )
+
+        self.assertEqual(
+            self.summary(),
+            {
+                "active_borrowings": 1,
+                "pending_payments": 1,
+                "outstanding_balance": "4.00",
+            },
+        )
+
+    def test_rebuild_repairs_drifted_summaries(self, *_):
+        self.checkout()
+        AccountSummary.objects.update(active_borrowings=7)
+
+        with self.assertRaises(CommandError):
+            call_command(
+                "rebuild_account_summaries",
+                verify=True,
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+
+        call_command("rebuild_account_summaries", stdout=io.StringIO())
+        call_command(
+            "rebuild_account_summaries", verify=True, stdout=io.StringIO()
+        )
+        self.assertEqual(self.summary()["active_borrowings"], 2)
+
+
+class BorrowingPriceAnnotationTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.book = sample_book(daily_fee=3)
+        self.today = timezone.now().date()
+
+    def sample_borrowing(self, expected_in, returned_in=None):
+        borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=self.today + timedelta(days=expected_in),
+        )
+        if returned_in is not None:
+            borrowing.actual_return_date = self.today + timedelta(
+                days=returned_in
+            )
+            borrowing.save()
+        return borrowing
+
+    def test_prices_match_model_properties(self):
+        for expected_in, returned_in in ((4, 2), (4, 4), (2, 5)):
+            borrowing = self.sample_borrowing(expected_in, returned_in)
+            annotated = Borrowing.objects.with_prices().get(pk=borrowing.pk)
+
+            self.assertEqual(annotated.total_amount, borrowing.total_price)
+            self.assertEqual(
+                annotated.fine_amount, max(borrowing.fine_price, 0)
+            )
+
+    def test_active_borrowings_are_fined_as_of_date(self):
+        borrowing = self.sample_borrowing(1)
+        borrowings = Borrowing.objects.filter(pk=borrowing.pk)
+
+        self.assertEqual(borrowings.with_prices().get().fine_amount, 0)
+        self.assertEqual(
+            borrowings.with_prices(self.today + timedelta(days=4))
+            .get()
+            .fine_amount,
+            18,
+        )
+
+    def test_list_exposes_prices_without_loading_books(self):
+        self.sample_borrowing(2, 5)
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.get(BORROWING_BOOK)
+
+        borrowing = res.data["results"][0]
+        self.assertEqual(borrowing["total_price"], "6.00")
+        self.assertEqual(borrowing["fine_price"], "18.00")
+        self.assertEqual(
+            Borrowing.objects.with_prices()
+            .values_list("total_amount", flat=True)
+            .get(),
+            6,
+        )
+
+
+@patch("borrowing.tasks.deliver_notifications_task.delay")
+class AccrueFinesTaskTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.today = timezone.now().date()
+        book = sample_book(daily_fee=1)
+        self.overdue = [
+            Borrowing.objects.create(
+                user=self.user,
+                book=book,
+                expected_return_date=self.today - timedelta(days=days),
+            )
+            for days in (1, 3)
+        ]
+        Borrowing.objects.create(
+            user=self.user,
+            book=book,
+            expected_return_date=self.today + timedelta(days=1),
+        )
+
+    def fines(self):
+        return dict(
+            Payment.objects.filter(type=Payment.TypeChoices.FINE).values_list(
+                "borrowing_id", "money_to_pay"
+            )
+        )
+
+    def test_fines_are_accrued_and_reported(self, _):
+        report = accrue_fines_task()
+
+        self.assertEqual(
+            self.fines(), {self.overdue[0].id: 2, self.overdue[1].id: 6}
+        )
+        self.assertEqual(report["processed"], 2)
+        self.assertEqual(report["created"], 2)
+        run = FineAccrualRun.objects.get()
+        self.assertEqual(run.updated, 0)
+        self.assertGreater(run.rows_per_second, 0)
+
+        summary = AccountSummary.objects.get(user=self.user)
+        self.assertEqual(summary.pending_payments, 2)
+        self.assertEqual(summary.outstanding_balance, 8)
+
+    @patch("borrowing.tasks.FINE_ACCRUAL_CHUNK_SIZE", 1)
+    def test_later_runs_update_fines_in_place(self, _):
+        accrue_fines_task()
+        report = accrue_fines_task(
+            (self.today + timedelta(days=1)).isoformat()
+        )
+
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(report["updated"], 2)
+        self.assertEqual(
+            self.fines(), {self.overdue[0].id: 4, self.overdue[1].id: 8}
+        )
+        self.assertEqual(
+            AccountSummary.objects.get(user=self.user).outstanding_balance,
+            12,
+        )
+
+    def test_return_settles_the_accrued_fine(self, _):
+        accrue_fines_task((self.today - timedelta(days=1)).isoformat())
+        borrowing = self.overdue[1]
+        self.assertEqual(self.fines(), {borrowing.id: 4})
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.post(
+            reverse("borrowing:borrowing-book-return", args=[borrowing.id])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.fines(), {borrowing.id: 6})
+        call_command(
+            "rebuild_account_summaries", verify=True, stdout=io.StringIO()
+        )
+
+
+@patch("borrowing.tasks.deliver_notifications_task.delay")
+@patch("borrowing.tasks.create_stripe_session_task.delay")
+class TokenUserBorrowingTestCase(APITestCase):
+    def setUp(self):
+        get_user_model().objects.create_user("test@test.com", "testpass")
+        tokens = self.client.post(
+            reverse("user:token_obtain_pair"),
+            {"email": "test@test.com", "password": "testpass"},
+        ).data
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"
+        )
+
+    def test_borrow_and_list_with_token_user(self, *_):
+        res = self.client.post(
+            BORROWING_BOOK,
+            {
+                "book": sample_book().id,
+                "expected_return_date": timezone.now().date()
+                + timedelta(days=2),
+            },
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.get(BORROWING_BOOK)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["user"], "test@test.com")
+
+    def test_join_waitlist_with_token_user(self, *_):
+        res = self.client.post(
+            reverse("borrowing:waitlist-list"),
+            {"book": sample_book(inventory=0).id},
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.get(reverse("borrowing:waitlist-list"))
+        self.assertEqual(len(res.data), 1)
+
+
+class BorrowingConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=sample_book(),
+            expected_return_date=timezone.now().date() + timedelta(days=3),
+        )
+        self.payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            session_id="cs_test",
+            money_to_pay=6,
+        )
+
+    def test_unchanged_list_returns_304_after_one_query(self):
+        etag = self.client.get(BORROWING_BOOK)["ETag"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(BORROWING_BOOK, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_payment_change_invalidates_list_and_detail(self):
+        detail_url = reverse(
+            "borrowing:borrowing-detail", args=[self.borrowing.id]
+        )
+        etags = {
+            url: self.client.get(url)["ETag"]
+            for url in (BORROWING_BOOK, detail_url)
+        }
+
+        self.payment.status = Payment.StatusChoices.PAID
+        self.payment.save()
+
+        for url, etag in etags.items():
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(res["ETag"], etag)
+
+    def test_other_users_get_their_own_etag(self):
+        etag = self.client.get(BORROWING_BOOK)["ETag"]
+        other = get_user_model().objects.create_user(
+            "other@test.com", "testpass"
+        )
+        self.client.force_authenticate(user=other)
+
+        res = self.client.get(BORROWING_BOOK, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@patch("borrowing.tasks.deliver_notifications_task.delay")
+@patch("borrowing.tasks.create_stripe_session_task.delay")
+class WaitlistTestCase(APITestCase):
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(
+                f"user{number}@test.com", "testpass"
+            )
+            for number in range(3)
+        ]
+        self.book = sample_book(inventory=1)
+        self.borrowing = Borrowing.objects.create(
+            user=self.users[0],
+            book=self.book,
+            expected_return_date=timezone.now().date() + timedelta(days=7),
+        )
+        self.book.inventory = 0
+        self.book.save()
+
+    def join(self, user, book=None):
+        self.client.force_authenticate(user=user)
+        return self.client.post(
+            reverse("borrowing:waitlist-list"),
+            {"book": (book or self.book).id},
+        )
+
+    def return_book(self):
+        self.client.force_authenticate(user=self.users[0])
+        return self.client.post(
+            reverse(
+                "borrowing:borrowing-book-return", args=[self.borrowing.id]
+            )
+        )
+
+    def borrow(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post(
+            BORROWING_BOOK,
+            {
+                "book": self.book.id,
+                "expected_return_date": timezone.now().date()
+                + timedelta(days=7),
+            },
+        )
+
+    def entry(self, user):
+        return WaitlistEntry.objects.get(user=user)
+
+    def test_join_only_when_out_of_stock_and_once(self, *_):
+        self.assertEqual(
+            self.join(self.users[1]).status_code, status.HTTP_201_CREATED
+        )
+        self.assertEqual(
+            self.join(self.users[1]).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        other = sample_book(inventory=1)
+        self.assertEqual(
+            self.join(self.users[1], other).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    def test_return_holds_copy_for_head_of_queue(self, *_):
+        self.join(self.users[1])
+        self.join(self.users[2])
+        notifications = Notification.objects.count()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.return_book().status_code, 200)
+        self.assertFalse(
+            any(
+                "waitlist" in query["sql"] and "LIMIT" not in query["sql"]
+                for query in queries.captured_queries
+                if query["sql"].startswith("SELECT")
+            )
+        )
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(
+            self.entry(self.users[1]).status,
+            WaitlistEntry.StatusChoices.HELD,
+        )
+        self.assertEqual(
+            self.entry(self.users[2]).status,
+            WaitlistEntry.StatusChoices.WAITING,
+        )
+        self.assertEqual(Notification.objects.count(), notifications + 1)
+        self.assertIn(
+            self.users[1].email, Notification.objects.latest("id").message
+        )
+
+        self.assertEqual(
+            self.borrow(self.users[2]).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(
+            self.borrow(self.users[1]).status_code, status.HTTP_201_CREATED
+        )
+        self.assertEqual(
+            self.entry(self.users[1]).status,
+            WaitlistEntry.StatusChoices.CLAIMED,
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_holder_takes_held_copy_while_others_are_on_shelf(self, *_):
+        self.join(self.users[1])
+        self.return_book()
+        Book.objects.filter(pk=self.book.pk).update(inventory=1)
+
+        self.assertEqual(
+            self.borrow(self.users[1]).status_code, status.HTTP_201_CREATED
+        )
+
+        self.assertEqual(
+            self.entry(self.users[1]).status,
+            WaitlistEntry.StatusChoices.CLAIMED,
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+    def test_return_without_waitlist_restocks(self, *_):
+        self.return_book()
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+    def test_sweeper_passes_expired_hold_on_then_restocks(self, *_):
+        self.join(self.users[1])
+        self.join(self.users[2])
+        self.return_book()
+        WaitlistEntry.objects.filter(user=self.users[1]).update(
+            hold_expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        with patch("borrowing.tasks.WAITLIST_SWEEP_BATCH_SIZE", 1):
+            self.assertEqual(expire_waitlist_holds_task(), 1)
+
+        self.assertEqual(
+            self.entry(self.users[1]).status,
+            WaitlistEntry.StatusChoices.EXPIRED,
+        )
+        self.assertEqual(
+            self.entry(self.users[2]).status,
+            WaitlistEntry.StatusChoices.HELD,
+        )
+
+        WaitlistEntry.objects.filter(user=self.users[2]).update(
+            hold_expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertEqual(expire_waitlist_holds_task(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+    def test_leaving_with_a_hold_passes_it_on(self, *_):
+        self.join(self.users[1])
+        self.join(self.users[2])
+        self.return_book()
+
+        self.client.force_authenticate(user=self.users[1])
+        res = self.client.delete(
+            reverse(
+                "borrowing:waitlist-detail",
+                args=[self.entry(self.users[1]).id],
+            )
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self.entry(self.users[2]).status,
+            WaitlistEntry.StatusChoices.HELD,
+        )
@@ -1,11 +1,14 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 
-from borrowings.views import BorrowingViewSet, PaymentViewSet
+from borrowing.async_views import BorrowingReadView, PaymentReadView
+from borrowing.views import BorrowingViewSet, PaymentViewSet, WaitlistViewSet
 
 router = routers.DefaultRouter()
 router.register("borrowings", BorrowingViewSet, basename="borrowing")
 router.register("payments", PaymentViewSet, basename="payment")
+router.register("waitlist", WaitlistViewSet, basename="waitlist")
 
 urlpatterns = [
     path(
@@ -20,4 +23,28 @@ urlpatterns = [
     ),
 ] + router.urls
 
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path(
+            "borrowings/",
+            BorrowingReadView.as_view({"get": "list", "post": "create"}),
+            name="borrowing-list",
+        ),
+        path(
+            "borrowings/<int:pk>/",
+            BorrowingReadView.as_view({"get": "retrieve"}),
+            name="borrowing-detail",
+        ),
+        path(
+            "payments/",
+            PaymentReadView.as_view({"get": "list"}),
+            name="payment-list",
+        ),
+        path(
+            "payments/<int:pk>/",
+            PaymentReadView.as_view({"get": "retrieve"}),
+            name="payment-detail",
+        ),
+    ] + urlpatterns
+
 app_name = "borrowings"
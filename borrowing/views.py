@@ -1,39 +1,113 @@
-import os
+from datetime import date
 
 import stripe
+from django.db import transaction
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
-from borrowings.models import Borrowing, Payment
-from borrowings.notification_service import send_telegram_message
-from borrowings.serializers import (
+from borrowing.models import Borrowing, Payment, WaitlistEntry
+from borrowing.payment_service import (
+    construct_stripe_event,
+    get_payment_urls,
+    handle_stripe_event,
+    renew_session,
+)
+from borrowing.serializers import (
+    BorrowingCheckoutSerializer,
     BorrowingSerializer,
     BorrowingListSerializer,
     BorrowingReturnSerializer,
     PaymentSerializer,
+    WaitlistEntrySerializer,
 )
+from borrowing.waitlist import cancel_entry
+from library_service.async_views import AsyncCursorPagination
+from library_service.conditional import conditional_response
+from library_service.fast_list import ValuesListMixin
+from library_service.renderers import OrjsonRenderer
+from library_service.replica import ReplicaReadMixin
+
+
+def _borrowings_version_query(view, kwargs):
+    queryset = view.filter_borrowings(Borrowing.objects.all())
+    if "pk" in kwargs:
+        queryset = queryset.filter(pk=kwargs["pk"])
+
+    return queryset, {
+        "count": Count("id", distinct=True),
+        "payment_count": Count("payments"),
+        "borrowings": Max("updated_at"),
+        "books": Max("book__updated_at"),
+        "payments": Max("payments__updated_at"),
+    }
+
+
+def _borrowings_version(request, stats):
+    modified = [
+        stats[key]
+        for key in ("borrowings", "books", "payments")
+        if stats[key] is not None
+    ]
+    version = (
+        request.user.id,
+        stats["count"],
+        stats["payment_count"],
+        date.today(),
+    )
+    return max(modified, default=None), version
 
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+def borrowings_version(view, request, *args, **kwargs):
+    """Version marker of the borrowings a list or detail would show.
+
+    Covers the borrowings, their books and payments, and today's date
+    since unreturned borrowings accrue fines daily.
+    """
+    queryset, aggregates = _borrowings_version_query(view, kwargs)
+    return _borrowings_version(request, queryset.aggregate(**aggregates))
+
+
+async def aborrowings_version(view, request, *args, **kwargs):
+    """``borrowings_version`` with the aggregate query awaited."""
+    queryset, aggregates = _borrowings_version_query(view, kwargs)
+    return _borrowings_version(
+        request, await queryset.aaggregate(**aggregates)
+    )
+
+
+class BorrowingPagination(AsyncCursorPagination):
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "-id"
 
 
 class BorrowingViewSet(
+    ReplicaReadMixin,
+    ValuesListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Borrowing.objects.select_related("book", "user")
+    queryset = Borrowing.objects.select_related(
+        "book", "user"
+    ).prefetch_related("payments")
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = BorrowingPagination
+    renderer_classes = (OrjsonRenderer, BrowsableAPIRenderer)
 
     def get_queryset(self):
-        queryset = self.queryset
+        return self.filter_borrowings(self.queryset.with_prices())
+
+    def filter_borrowings(self, queryset):
         is_active = self.request.query_params.get("is_active")
         user_id = self.request.query_params.get("user_id")
 
@@ -49,7 +123,7 @@ class BorrowingViewSet(
 
             return queryset
 
-        return queryset.filter(user=self.request.user)
+        return queryset.filter(user_id=self.request.user.id)
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
@@ -58,6 +132,9 @@ class BorrowingViewSet(
         if self.action == "book_return":
             return BorrowingReturnSerializer
 
+        if self.action == "checkout":
+            return BorrowingCheckoutSerializer
+
         return BorrowingSerializer
 
     def perform_create(self, serializer):
@@ -79,9 +156,23 @@ class BorrowingViewSet(
             ),
         ]
     )
+    @conditional_response(borrowings_version)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @conditional_response(borrowings_version)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(methods=["POST"], detail=False, url_path="checkout")
+    def checkout(self, request):
+        """Borrow several books with one payment session"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(methods=["POST"], detail=True, url_path="return")
     def book_return(self, request, pk=None):
         """Return a borrowed book"""
@@ -96,7 +187,7 @@ class BorrowingViewSet(
         )
 
 
-class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
@@ -105,37 +196,73 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
         queryset = self.queryset
 
         if not self.request.user.is_staff:
-            return queryset.filter(borrowing__user=self.request.user)
+            return queryset.filter(borrowing__user_id=self.request.user.id)
 
         return queryset
 
     @action(detail=True, methods=["GET"], url_path="success")
     def payment_success(self, request, pk=None):
-        """Handle a successful payment"""
-        payment = get_object_or_404(Payment, pk=pk)
-
-        session = stripe.checkout.Session.retrieve(payment.session_id)
-        if session.payment_status == "paid":
-            payment.status = Payment.StatusChoices.PAID
-            payment.save()
+        """Handle a successful payment
 
-            message = (
-                f"Payment #{payment.id} was successful.\n"
-                f"Type: {payment.type}\n"
-                f"Borrowing: {payment.borrowing}"
-            )
-            send_telegram_message(message)
+        The payment is marked as paid by the Stripe webhook, so this
+        only reports the local state.
+        """
+        payment = get_object_or_404(Payment, pk=pk)
 
+        if payment.status == Payment.StatusChoices.PAID:
             return Response(
                 {"success": "Payment was successful."},
                 status=status.HTTP_200_OK,
             )
-        else:
+
+        return Response(
+            {"message": "Payment is being confirmed."},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="webhook",
+        permission_classes=[AllowAny],
+        authentication_classes=[],
+    )
+    def webhook(self, request):
+        """Receive Stripe checkout session events"""
+        try:
+            event = construct_stripe_event(
+                request.body, request.headers.get("Stripe-Signature", "")
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            return Response(
+                {"error": "Invalid Stripe webhook."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        handle_stripe_event(event)
+
+        return Response({"received": True}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["POST"], url_path="renew-session")
+    def renew_session(self, request, pk=None):
+        """Open a new payment session once the previous ones expired"""
+        payment = self.get_object()
+
+        if (
+            payment.status != Payment.StatusChoices.PENDING
+            or payment.session_id
+        ):
             return Response(
-                {"error": "Payment was not successful."},
+                {"error": "Payment is paid or has an open session."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        renew_session(payment, *get_payment_urls(request, payment))
+        return Response(
+            {"message": "A new payment session is being opened."},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
     @action(detail=True, methods=["GET"], url_path="cancel")
     def payment_cancel(self, request, pk=None):
         """Handle a canceled payment"""
@@ -143,3 +270,35 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
             {"message": "Payment can be made later."},
             status=status.HTTP_200_OK,
         )
+
+
+class WaitlistViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Queue for books that are out of stock.
+
+    Returned copies are held for the first user in line, who can then
+    borrow the book as usual until the hold expires.
+    """
+
+    queryset = WaitlistEntry.objects.filter(
+        status__in=(
+            WaitlistEntry.StatusChoices.WAITING,
+            WaitlistEntry.StatusChoices.HELD,
+        )
+    ).order_by("id")
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(user_id=self.request.user.id)
+
+    def perform_create(self, serializer):
+        serializer.save(user_id=self.request.user.id)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        cancel_entry(instance)
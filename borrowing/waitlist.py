@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from borrowing.inventory import release_book
+from borrowing.models import WaitlistEntry
+from borrowing.notification_service import enqueue_notification
+
+
+HOLD_PERIOD = timedelta(hours=48)
+
+
+def allocate_copies(book_id, copies=1):
+    """Hold returned copies of a book for the head of its waitlist.
+
+    Must run inside the transaction that freed the copies. The head is
+    read from the ``waitlist_queue_idx`` partial index, so the cost does
+    not grow with the queue, and locked without skipping, so an entry
+    another transaction holds (e.g. while cancelling) is waited for
+    rather than jumped. Copies nobody waits for go back on the shelf.
+    The users served are notified once the transaction commits.
+    Returns the entries put on hold.
+    """
+    head = list(
+        WaitlistEntry.objects.select_for_update()
+        .select_related("book", "user")
+        .filter(book_id=book_id, status=WaitlistEntry.StatusChoices.WAITING)
+        .order_by("id")[:copies]
+    )
+
+    if head:
+        hold_expires_at = timezone.now() + HOLD_PERIOD
+        WaitlistEntry.objects.filter(
+            pk__in=[entry.pk for entry in head]
+        ).update(
+            status=WaitlistEntry.StatusChoices.HELD,
+            hold_expires_at=hold_expires_at,
+        )
+        for entry in head:
+            entry.status = WaitlistEntry.StatusChoices.HELD
+            entry.hold_expires_at = hold_expires_at
+            enqueue_notification(
+                f"Book on hold:\nUser: {entry.user.email}\n"
+                f"Book: {entry.book.title}\n"
+                f"Borrow it by: {hold_expires_at:%Y-%m-%d %H:%M} UTC"
+            )
+
+    if len(head) < copies:
+        release_book(book_id, copies - len(head))
+
+    return head
+
+
+def has_hold(user_id, book_id):
+    return WaitlistEntry.objects.filter(
+        user_id=user_id,
+        book_id=book_id,
+        status=WaitlistEntry.StatusChoices.HELD,
+        hold_expires_at__gt=timezone.now(),
+    ).exists()
+
+
+def claim_holds(user_id, book_ids):
+    """Mark the user's live holds on these books as borrowed.
+
+    Must run inside a transaction. The holds are locked before they are
+    claimed, so a concurrent checkout or ``expire_holds`` that got there
+    first leaves them out. Returns the ids of the books whose held copy
+    the user just took, so the caller only reserves shelf copies for the
+    others.
+    """
+    if not book_ids:
+        return set()
+
+    holds = dict(
+        WaitlistEntry.objects.select_for_update()
+        .filter(
+            user_id=user_id,
+            book_id__in=book_ids,
+            status=WaitlistEntry.StatusChoices.HELD,
+            hold_expires_at__gt=timezone.now(),
+        )
+        .order_by("id")
+        .values_list("id", "book_id")
+    )
+    if holds:
+        WaitlistEntry.objects.filter(pk__in=holds.keys()).update(
+            status=WaitlistEntry.StatusChoices.CLAIMED
+        )
+    return set(holds.values())
+
+
+def cancel_entry(entry):
+    """Leave the waitlist, passing a held copy on to the next user."""
+    held = entry.status == WaitlistEntry.StatusChoices.HELD
+    entry.delete()
+    if held:
+        allocate_copies(entry.book_id)
+
+
+def expire_holds(as_of, limit):
+    """Expire up to ``limit`` holds and pass their copies on.
+
+    Returns the number of holds expired.
+    """
+    expired = list(
+        WaitlistEntry.objects.select_for_update(skip_locked=True)
+        .filter(
+            status=WaitlistEntry.StatusChoices.HELD,
+            hold_expires_at__lte=as_of,
+        )
+        .order_by("hold_expires_at", "id")
+        .values_list("id", "book_id")[:limit]
+    )
+    if not expired:
+        return 0
+
+    WaitlistEntry.objects.filter(
+        pk__in=[entry_id for entry_id, _ in expired]
+    ).update(status=WaitlistEntry.StatusChoices.EXPIRED)
+
+    copies = {}
+    for _, book_id in expired:
+        copies[book_id] = copies.get(book_id, 0) + 1
+    for book_id, count in copies.items():
+        allocate_copies(book_id, count)
+
+    return len(expired)
@@ -0,0 +1,286 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import classonlymethod
+from rest_framework import exceptions
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from library_service.conditional import conditional_validators, set_validators
+from library_service.fast_list import ValuesRowBuilder
+
+
+class _PageFetch(Exception):
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+
+class _PageQuery:
+    """Stands in for the queryset ``CursorPagination`` pages through.
+
+    Ordering and filtering go to the real queryset. Slicing it raises
+    ``_PageFetch`` with the page query until the awaited ``rows`` are
+    given, which the slice then returns.
+    """
+
+    def __init__(self, queryset, rows=None):
+        self.queryset = queryset
+        self.rows = rows
+
+    def order_by(self, *fields):
+        return _PageQuery(self.queryset.order_by(*fields), self.rows)
+
+    def filter(self, *args, **kwargs):
+        return _PageQuery(self.queryset.filter(*args, **kwargs), self.rows)
+
+    def __getitem__(self, key):
+        if self.rows is None:
+            raise _PageFetch(self.queryset[key])
+        return self.rows
+
+
+class AsyncCursorPagination(CursorPagination):
+    """Cursor pagination that can also fetch its page with the async ORM.
+
+    ``apaginate_queryset`` runs DRF's ``paginate_queryset`` twice: once
+    to build the page query, which is then awaited, and once to page
+    through the fetched rows.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        try:
+            return self.paginate_queryset(_PageQuery(queryset), request, view)
+        except _PageFetch as fetch:
+            rows = [row async for row in fetch.queryset]
+        return self.paginate_queryset(
+            _PageQuery(queryset, rows), request, view
+        )
+
+
+class _AwaitedAuthenticator:
+    """Replays the outcome of an authenticator that was awaited."""
+
+    def __init__(self, authenticator, result=None, error=None):
+        self.authenticator = authenticator
+        self.result = result
+        self.error = error
+
+    def authenticate(self, request):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _AwaitedThrottle:
+    """Replays the outcome of a throttle check that was awaited."""
+
+    def __init__(self, throttle, allowed):
+        self.throttle = throttle
+        self.allowed = allowed
+
+    def allow_request(self, request, view):
+        return self.allowed
+
+    def wait(self):
+        return self.throttle.wait()
+
+
+class AsyncRequest(Request):
+    """DRF request whose authentication can be awaited."""
+
+    async def aauthenticate(self):
+        """Await the authenticators, then let DRF apply the outcome.
+
+        Authenticators with an ``aauthenticate`` method are awaited,
+        others run in a thread. Must be awaited before ``user`` is
+        read, which would otherwise authenticate synchronously.
+        """
+        awaited = []
+        for authenticator in self.authenticators:
+            try:
+                if hasattr(authenticator, "aauthenticate"):
+                    result = await authenticator.aauthenticate(self)
+                else:
+                    result = await sync_to_async(authenticator.authenticate)(
+                        self
+                    )
+            except exceptions.APIException as error:
+                awaited.append(
+                    _AwaitedAuthenticator(authenticator, error=error)
+                )
+                break
+            awaited.append(_AwaitedAuthenticator(authenticator, result))
+            if result is not None:
+                break
+
+        authenticators = self.authenticators
+        self.authenticators = awaited
+        try:
+            self._authenticate()
+        finally:
+            self.authenticators = authenticators
+            if isinstance(self._authenticator, _AwaitedAuthenticator):
+                self._authenticator = self._authenticator.authenticator
+
+
+class AsyncReadView:
+    """Serve the read actions of a DRF viewset natively async.
+
+    The viewset is instantiated as usual for its queryset, serializer,
+    permissions, paginator and renderers, but authentication and every
+    query are awaited, so under ASGI no thread is held while waiting on
+    the cache or the database: throttles and the replica pin are awaited
+    before DRF's ``initial`` runs in the event loop, which leaves it
+    only pure checks. List and retrieve bodies are built from
+    ``.values()`` rows and match the sync views byte for byte. Actions
+    without an async ``a<action>`` method run the sync viewset in a
+    thread. Object permissions are not checked on retrieve, as none of
+    the read views define any.
+    """
+
+    viewset_class = None
+
+    def __init__(self, actions, **initkwargs):
+        self.actions = actions
+        self.initkwargs = initkwargs
+        self.sync_view = sync_to_async(
+            self.viewset_class.as_view(actions, **initkwargs)
+        )
+
+    @classonlymethod
+    def as_view(cls, actions, **initkwargs):
+        self = cls(actions, **initkwargs)
+
+        async def view(request, *args, **kwargs):
+            method = request.method.lower()
+            if method == "head" and "get" in self.actions:
+                method = "get"
+            action = self.actions.get(method)
+            if not hasattr(self, f"a{action}"):
+                return await self.sync_view(request, *args, **kwargs)
+            return await self.dispatch(action, request, *args, **kwargs)
+
+        view.csrf_exempt = True
+        return view
+
+    def get_viewset(self, action, request, *args, **kwargs):
+        viewset = self.viewset_class(**self.initkwargs)
+        viewset.action_map = self.actions
+        viewset.action = action
+        viewset.args = args
+        viewset.kwargs = kwargs
+        for method, name in self.actions.items():
+            setattr(viewset, method, getattr(viewset, name))
+        viewset.headers = viewset.default_response_headers
+        viewset.format_kwarg = None
+        viewset.request = AsyncRequest(
+            request,
+            parsers=viewset.get_parsers(),
+            authenticators=viewset.get_authenticators(),
+            negotiator=viewset.get_content_negotiator(),
+            parser_context=viewset.get_parser_context(request),
+        )
+        return viewset
+
+    async def dispatch(self, action, request, *args, **kwargs):
+        viewset = self.get_viewset(action, request, *args, **kwargs)
+        request = viewset.request
+
+        try:
+            await request.aauthenticate()
+            await self.ainitial(viewset, request, *args, **kwargs)
+            response = await self.get_response(
+                action, viewset, request, *args, **kwargs
+            )
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+
+        response = viewset.finalize_response(request, response)
+        if not isinstance(response, Response):
+            return response
+        if isinstance(response.accepted_renderer, JSONRenderer):
+            return response.render()
+        return await sync_to_async(response.render)()
+
+    async def ainitial(self, viewset, request, *args, **kwargs):
+        """Await what ``initial`` would look up, then run it.
+
+        Throttles with an ``aallow_request`` method are awaited, others
+        run in a thread; their outcomes and the replica pin are handed
+        to ``initial`` in place of the lookups.
+        """
+        throttles = []
+        for throttle in viewset.get_throttles():
+            if hasattr(throttle, "aallow_request"):
+                allowed = await throttle.aallow_request(request, viewset)
+            else:
+                allowed = await sync_to_async(throttle.allow_request)(
+                    request, viewset
+                )
+            throttles.append(_AwaitedThrottle(throttle, allowed))
+        viewset.get_throttles = lambda: throttles
+
+        if hasattr(viewset, "ais_pinned_to_primary"):
+            pinned = await viewset.ais_pinned_to_primary(request)
+            viewset.is_pinned_to_primary = lambda request: pinned
+
+        viewset.initial(request, *args, **kwargs)
+
+    async def get_response(self, action, viewset, request, *args, **kwargs):
+        handler = getattr(self, f"a{action}")
+        version = await self.get_version(viewset, request, *args, **kwargs)
+        if version is None:
+            return await handler(viewset, request, *args, **kwargs)
+
+        etag, timestamp = conditional_validators(request, *version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = await handler(viewset, request, *args, **kwargs)
+        set_validators(response, etag, timestamp)
+        return response
+
+    async def get_version(self, viewset, request, *args, **kwargs):
+        """Like ``conditional_response``'s ``get_version``, or None."""
+        return None
+
+    async def alist(self, viewset, request, *args, **kwargs):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        builder = ValuesRowBuilder(viewset.get_serializer())
+        paginator = viewset.paginator
+
+        ordering = ()
+        if paginator is not None and hasattr(paginator, "get_ordering"):
+            ordering = [
+                field.lstrip("-")
+                for field in paginator.get_ordering(request, queryset, viewset)
+            ]
+        rows = builder.values(queryset, *ordering)
+
+        if paginator is not None:
+            page = await paginator.apaginate_queryset(rows, request, viewset)
+            if page is not None:
+                return paginator.get_paginated_response(
+                    await builder.abuild(page)
+                )
+        return Response(await builder.abuild([row async for row in rows]))
+
+    async def aretrieve(self, viewset, request, *args, **kwargs):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        builder = ValuesRowBuilder(viewset.get_serializer())
+
+        try:
+            row = await builder.values(
+                queryset.filter(
+                    **{viewset.lookup_field: kwargs[lookup_url_kwarg]}
+                )
+            ).afirst()
+        except (TypeError, ValueError, ValidationError):
+            row = None
+        if row is None:
+            raise exceptions.NotFound()
+        return Response((await builder.abuild([row]))[0])
@@ -0,0 +1,49 @@
+import functools
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def conditional_validators(request, last_modified, version):
+    """The ETag and Last-Modified timestamp for a version marker."""
+    marker = f"{request.get_full_path()}|{last_modified}|{version}"
+    etag = quote_etag(hashlib.md5(marker.encode()).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return etag, timestamp
+
+
+def set_validators(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+
+
+def conditional_response(get_version):
+    """Answer conditional GETs of a view method from a version marker.
+
+    ``get_version(view, request, *args, **kwargs)`` returns the last
+    modification time (or None) and a tuple of values that change
+    whenever the response body would. It should be a single aggregate
+    query, so a 304 is sent without fetching or serializing any rows.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            etag, timestamp = conditional_validators(
+                request, *get_version(view, request, *args, **kwargs)
+            )
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+            set_validators(response, etag, timestamp)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,164 @@
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+# Fields whose representation of a ``.values()`` value is the value.
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+    serializers.ReadOnlyField,
+)
+
+
+class ValuesRowBuilder:
+    """Build a serializer's list output from ``.values()`` rows.
+
+    The serializer is only inspected once for its fields and their
+    sources; rows are then plain dicts turned into the same nested
+    structure, with ``to_representation`` called only for fields that
+    actually transform their value (dates, decimals...). Nested
+    serializers become joined columns, nested ``many=True`` serializers
+    of reverse foreign keys one extra query per page.
+    """
+
+    def __init__(self, serializer, prefix=""):
+        self.entries = []
+        self.paths = []
+        self.related = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == "*":
+                raise ImproperlyConfigured(
+                    f"Field {name!r} with source='*' cannot be built "
+                    "from values()."
+                )
+            path = prefix + "__".join(field.source_attrs)
+
+            if isinstance(field, serializers.ListSerializer):
+                if prefix:
+                    raise ImproperlyConfigured(
+                        f"Nested many=True field {name!r} is only "
+                        "supported at the top level."
+                    )
+                self._add_related(serializer, name, field)
+                self.entries.append((name, None, None))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = ValuesRowBuilder(field, f"{path}__")
+                self.paths.append(path)
+                self.paths.extend(nested.paths)
+                self.entries.append((name, path, nested))
+            else:
+                self.paths.append(path)
+                convert = (
+                    None
+                    if isinstance(field, PASSTHROUGH_FIELDS)
+                    else field.to_representation
+                )
+                self.entries.append((name, path, convert))
+
+        if self.related:
+            self.paths.append("pk")
+
+    def _add_related(self, serializer, name, field):
+        relation = serializer.Meta.model._meta.get_field(field.source)
+        if not relation.one_to_many:
+            raise ImproperlyConfigured(
+                f"Nested many=True field {name!r} must be a reverse "
+                "foreign key."
+            )
+        child = ValuesRowBuilder(field.child)
+        self.related.append(
+            (name, relation.related_model, relation.field.attname, child)
+        )
+
+    def values(self, queryset, *extra):
+        """The ``.values()`` queryset the rows are built from."""
+        return (
+            queryset.select_related(None)
+            .prefetch_related(None)
+            .values(*dict.fromkeys([*self.paths, *extra]))
+        )
+
+    def build(self, rows):
+        rows = list(rows)
+        related = {
+            name: self._group_related(
+                fk, child, self._related_rows(model, fk, child, rows)
+            )
+            for name, model, fk, child in self.related
+        }
+        return [self._build_row(row, related) for row in rows]
+
+    async def abuild(self, rows):
+        """``build()`` fetching the related rows with the async ORM."""
+        related = {}
+        for name, model, fk, child in self.related:
+            children = self._related_rows(model, fk, child, rows)
+            related[name] = self._group_related(
+                fk, child, [row async for row in children]
+            )
+        return [self._build_row(row, related) for row in rows]
+
+    def _related_rows(self, model, fk, child, rows):
+        return (
+            model.objects.filter(**{f"{fk}__in": [row["pk"] for row in rows]})
+            .order_by("pk")
+            .values(fk, *child.paths)
+        )
+
+    def _group_related(self, fk, child, children):
+        grouped = defaultdict(list)
+        for row in children:
+            grouped[row[fk]].append(child._build_row(row, {}))
+        return grouped
+
+    def _build_row(self, row, related):
+        data = {}
+        for name, path, convert in self.entries:
+            if path is None:
+                data[name] = related[name].get(row["pk"], [])
+                continue
+            value = row[path]
+            if isinstance(convert, ValuesRowBuilder):
+                value = None if value is None else convert._build_row(row, {})
+            elif convert is not None and value is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+
+class ValuesListMixin:
+    """``list()`` built by ``ValuesRowBuilder`` instead of serializers.
+
+    Produces the same JSON as the regular list for the view's
+    serializer, including cursor pagination over the values rows.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        builder = ValuesRowBuilder(self.get_serializer())
+
+        ordering = ()
+        if self.paginator is not None and hasattr(
+            self.paginator, "get_ordering"
+        ):
+            ordering = [
+                field.lstrip("-")
+                for field in self.paginator.get_ordering(
+                    request, queryset, self
+                )
+            ]
+        rows = builder.values(queryset, *ordering)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(builder.build(page))
+        return Response(builder.build(rows))
@@ -0,0 +1,32 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class OrjsonRenderer(JSONRenderer):
+    """``JSONRenderer`` producing the same bytes through orjson.
+
+    Pretty-printed output and non-default JSON settings are left to the
+    stdlib encoder. Types orjson does not handle the way DRF does
+    (datetimes, decimals, lazy strings...) go through DRF's encoder.
+    Floats in exponent notation (``1e20`` vs ``1e+20``) are the one known
+    difference, so only use it for payloads without floats.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (
+            data is None
+            or indent is not None
+            or self.ensure_ascii
+            or not self.compact
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        )
+        return ret.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+PRIMARY_PIN_TIMEOUT = 5
+
+_read_database = ContextVar("read_database", default=None)
+_writes = ContextVar("writes", default=None)
+
+
+def _pin_key(user_id):
+    return f"db:primary-pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """Read from the primary for this user until the replica caught up."""
+    cache.set(_pin_key(user_id), True, PRIMARY_PIN_TIMEOUT)
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(_pin_key(user_id), False)
+
+
+async def ais_pinned_to_primary(user_id):
+    return await cache.aget(_pin_key(user_id), False)
+
+
+@contextmanager
+def track_writes():
+    """Collect the aliases written to, see ``PrimaryReplicaRouter``."""
+    writes = set()
+    token = _writes.set(writes)
+    try:
+        yield writes
+    finally:
+        _writes.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and opted-in reads to the replica.
+
+    Reads only go to the replica during the read actions of
+    ``ReplicaReadMixin`` views; everything else, including the reads of
+    a request that writes, stays on the primary. Writes are recorded
+    for ``track_writes()``.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes.add(DEFAULT_DB_ALIAS)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, settings.REPLICA_DATABASE}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """Serve ``replica_actions`` from the replica database.
+
+    Users who wrote anything in the last ``PRIMARY_PIN_TIMEOUT`` seconds
+    keep reading from the primary, so they see their own writes despite
+    replication lag.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def is_pinned_to_primary(self, request):
+        return request.user.is_authenticated and is_pinned_to_primary(
+            request.user.id
+        )
+
+    async def ais_pinned_to_primary(self, request):
+        return request.user.is_authenticated and (
+            await ais_pinned_to_primary(request.user.id)
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            settings.REPLICA_DATABASE
+            and self.action in self.replica_actions
+            and not self.is_pinned_to_primary(request)
+        ):
+            # Restored by value rather than with a token, so that views
+            # which set it in a copy of the context can still undo it.
+            self._replica_previous = _read_database.get()
+            _read_database.set(settings.REPLICA_DATABASE)
+            self._replica_reading = True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if getattr(self, "_replica_reading", False):
+            _read_database.set(self._replica_previous)
+            self._replica_reading = False
+        return super().finalize_response(request, response, *args, **kwargs)
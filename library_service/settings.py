@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from datetime import timedelta
 from pathlib import Path
+
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library_service.middleware.QueryCountMiddleware",
+    "library_service.middleware.PrimaryPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -57,7 +61,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "library-service.urls"
+ROOT_URLCONF = "library_service.urls"
 
 TEMPLATES = [
     {
@@ -84,10 +88,38 @@ WSGI_APPLICATION = "library_service.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "NAME": os.environ.get("DATABASE_NAME", BASE_DIR / "db.sqlite3"),
+    },
+    # Read replica of "default". Reads are only routed to it when
+    # DATABASE_REPLICA_NAME is set; tests get their own copy to stand
+    # in for a lagging replica.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get(
+            "DATABASE_REPLICA_NAME", BASE_DIR / "db.sqlite3"
+        ),
+    },
 }
 
+DATABASE_ROUTERS = ["library_service.replica.PrimaryReplicaRouter"]
+REPLICA_DATABASE = (
+    "replica" if os.environ.get("DATABASE_REPLICA_NAME") else None
+)
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 AUTH_USER_MODEL = "user.User"
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -124,6 +156,9 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+MEDIA_URL = "media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -133,18 +168,70 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.StatelessJWTAuthentication",
     ),
+    "PAGE_SIZE": 20,
 }
 
+# PAGE_SIZE is the default for the per-view cursor paginators.
+SILENCED_SYSTEM_CHECKS = ["rest_framework.W001"]
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60 * 60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
+    "TOKEN_OBTAIN_SERIALIZER": (
+        "user.serializers.ClaimsTokenObtainPairSerializer"
+    ),
+    "TOKEN_USER_CLASS": "user.authentication.LibraryTokenUser",
     # "AUTH_HEADER_NAME": "Authorize",
 }
 
+# Route the book, borrowing and payment reads to native async views.
+# Enabled by default when served through asgi.py.
+ASYNC_READ_VIEWS = os.environ.get("ASYNC_READ_VIEWS") == "1"
+
+# Set on a throwaway database that benchmark_load may fill with users,
+# borrowings and payments.
+BENCHMARK_DATABASE = os.environ.get("BENCHMARK_DATABASE") == "1"
+
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+# Where Stripe sends payers back when a session is opened outside of a
+# request, e.g. to replace an expired one.
+PAYMENT_REDIRECT_BASE_URL = os.environ.get(
+    "PAYMENT_REDIRECT_BASE_URL", "http://localhost:8000"
+)
+
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
+TELEGRAM_API_BASE = os.environ.get(
+    "TELEGRAM_API_BASE", "https://api.telegram.org"
+)
+
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
 CELERY_TIMEZONE = "Europe/Kiev"
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULE = {
+    "deliver-notifications": {
+        "task": "borrowing.tasks.deliver_notifications_task",
+        "schedule": timedelta(minutes=1),
+    },
+    "request-missing-stripe-sessions": {
+        "task": "borrowing.tasks.request_missing_stripe_sessions_task",
+        "schedule": timedelta(minutes=10),
+    },
+    "check-overdue-borrowings": {
+        "task": "borrowing.tasks.check_overdue_borrowings_task",
+        "schedule": crontab(hour=9, minute=0),
+    },
+    "accrue-fines": {
+        "task": "borrowing.tasks.accrue_fines_task",
+        "schedule": crontab(hour=1, minute=0),
+    },
+    "expire-waitlist-holds": {
+        "task": "borrowing.tasks.expire_waitlist_holds_task",
+        "schedule": timedelta(minutes=5),
+    },
+}
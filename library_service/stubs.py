@@ -0,0 +1,176 @@
+"""Local stand-ins for the third-party HTTP APIs the service calls.
+
+Each stub is a small threaded HTTP server bound to localhost, usable as
+a context manager from tests and benchmarks::
+
+    with StripeStub(latency=0.05) as stub:
+        stripe.api_base = stub.url
+"""
+import abc
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def sign_stripe_payload(payload, secret, timestamp=None):
+    """Return a ``Stripe-Signature`` header value for a webhook payload."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+class StubServer(abc.ABC):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), self._make_handler()
+        )
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @abc.abstractmethod
+    def handle(self, method, path, body):
+        """Return ``(status, payload)`` for a request."""
+
+    def _record(self, method, path, body):
+        with self._lock:
+            self.requests.append((method, path, body))
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def _respond(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode()
+                stub._record(method, self.path, body)
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                status, payload = stub.handle(method, self.path, body)
+                content = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class StripeStub(StubServer):
+    """Minimal Checkout Sessions API: create and retrieve."""
+
+    def __init__(self, latency=0.0, payment_status="paid"):
+        super().__init__(latency=latency)
+        self.payment_status = payment_status
+        self.sessions = {}
+
+    def handle(self, method, path, body):
+        if method == "POST" and path == "/v1/checkout/sessions":
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            session = {
+                "id": session_id,
+                "object": "checkout.session",
+                "url": f"{self.url}/pay/{session_id}",
+                "payment_status": "unpaid",
+                "metadata": {},
+            }
+            session["params"] = parse_qs(body)
+            with self._lock:
+                self.sessions[session_id] = session
+            return 200, session
+
+        prefix = "/v1/checkout/sessions/"
+        if method == "GET" and path.startswith(prefix):
+            session = self.sessions.get(path[len(prefix) :])
+            if session is None:
+                return 404, {"error": {"message": "No such session"}}
+            return 200, {**session, "payment_status": self.payment_status}
+
+        return 404, {"error": {"message": f"Unknown path {path}"}}
+
+
+class TelegramStub(StubServer):
+    """Bot API ``sendMessage`` that can answer every Nth call with 429."""
+
+    def __init__(self, latency=0.0, rate_limit_every=0, retry_after=0):
+        super().__init__(latency=latency)
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.messages = []
+        self._calls = 0
+
+    def handle(self, method, path, body):
+        if method != "POST" or not path.endswith("/sendMessage"):
+            return 404, {"ok": False, "description": "Not Found"}
+
+        with self._lock:
+            self._calls += 1
+            calls = self._calls
+            if not (
+                self.rate_limit_every and calls % self.rate_limit_every == 0
+            ):
+                self.messages.append(json.loads(body)["text"])
+                message_id = len(self.messages)
+            else:
+                message_id = None
+
+        if message_id is None:
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after "
+                f"{self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        return 200, {"ok": True, "result": {"message_id": message_id}}
@@ -0,0 +1,631 @@
+import io
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (
+    APIClient,
+    APIRequestFactory,
+    force_authenticate,
+)
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.async_views import BookReadView
+from book.models import Book
+from borrowing.account_summary import get_account_summary
+from borrowing.async_views import BorrowingReadView, PaymentReadView
+from borrowing.models import Borrowing, Payment
+from library_service.fast_list import ValuesListMixin
+from library_service.replica import is_pinned_to_primary, pin_to_primary
+from library_service.stubs import sign_stripe_payload
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Sample book",
+        "author": "Sample author",
+        "cover": "SOFT",
+        "inventory": 5,
+        "daily_fee": 2,
+    }
+    defaults.update(params)
+
+    return Book.objects.create(**defaults)
+
+
+def sample_borrowing(user, book, **params):
+    defaults = {
+        "expected_return_date": timezone.now().date() + timedelta(days=7),
+    }
+    defaults.update(params)
+    borrowing = Borrowing.objects.create(user=user, book=book, **defaults)
+    Payment.objects.create(
+        borrowing=borrowing,
+        status=Payment.StatusChoices.PAID,
+        type=Payment.TypeChoices.PAYMENT,
+        session_id="cs_test",
+        money_to_pay=14,
+    )
+
+    return borrowing
+
+
+class QueryCountMiddlewareTests(TestCase):
+    def test_headers_report_executed_queries(self):
+        cache.clear()
+        sample_book()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse("book:book-list"))
+
+        self.assertEqual(res["X-DB-Query-Count"], str(len(queries)))
+        self.assertGreaterEqual(float(res["X-DB-Time-Ms"]), 0)
+
+    async def test_async_requests_are_counted(self):
+        await cache.aclear()
+        await Book.objects.acreate(
+            title="Sample book",
+            author="Sample author",
+            cover="SOFT",
+            inventory=5,
+            daily_fee=2,
+        )
+
+        res = await self.async_client.get(reverse("book:book-list"))
+
+        self.assertEqual(res["X-DB-Query-Count"], "1")
+
+
+class QueryBudgetTestCase(TestCase):
+    """Pin an upper bound on the queries each endpoint may run.
+
+    List endpoints are additionally checked with a growing number of
+    rows, so any per-row query (N+1) fails even if it stays in budget
+    for a tiny fixture.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@test.com", "testpass"
+        )
+        self.admin = get_user_model().objects.create_user(
+            "admin@test.com", "testpass", is_staff=True
+        )
+        self.book = sample_book()
+
+    def assertQueryBudget(self, budget, method, url, **kwargs):
+        response = getattr(self.client, method)(url, **kwargs)
+        query_count = int(response["X-DB-Query-Count"])
+        self.assertLessEqual(
+            query_count,
+            budget,
+            f"{method.upper()} {url} ran {query_count} queries, "
+            f"budget is {budget}",
+        )
+        return response
+
+    def assertConstantQueries(self, url, add_rows):
+        first = int(self.client.get(url)["X-DB-Query-Count"])
+        add_rows()
+        second = int(self.client.get(url)["X-DB-Query-Count"])
+        self.assertEqual(
+            first, second, f"GET {url} query count grows with rows"
+        )
+
+
+class BookQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse("book:book-detail", args=[self.book.id])
+
+    def test_list(self):
+        self.assertQueryBudget(1, "get", reverse("book:book-list"))
+        self.assertConstantQueries(
+            reverse("book:book-list"),
+            lambda: [sample_book() for _ in range(5)],
+        )
+
+    def test_create(self):
+        payload = {
+            "title": "New",
+            "author": "Author",
+            "cover": "HARD",
+            "inventory": 1,
+            "daily_fee": 1,
+        }
+        res = self.assertQueryBudget(
+            1, "post", reverse("book:book-list"), data=payload
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_retrieve(self):
+        self.assertQueryBudget(1, "get", self.url)
+
+    def test_update(self):
+        payload = {
+            "title": "Updated",
+            "author": "Author",
+            "cover": "HARD",
+            "inventory": 1,
+            "daily_fee": 1,
+        }
+        self.assertQueryBudget(2, "put", self.url, data=payload)
+        self.assertQueryBudget(2, "patch", self.url, data={"inventory": 3})
+
+    def test_destroy(self):
+        self.assertQueryBudget(6, "delete", self.url)
+
+
+class BorrowingQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.borrowing = sample_borrowing(self.user, self.book)
+        self.payment = self.borrowing.payments.get()
+        get_account_summary(self.user.id)
+
+    def add_borrowings(self):
+        for _ in range(5):
+            sample_borrowing(self.user, sample_book())
+
+    def test_borrowing_list(self):
+        url = reverse("borrowing:borrowing-list")
+        self.assertQueryBudget(3, "get", url)
+        self.assertConstantQueries(url, self.add_borrowings)
+
+    def test_borrowing_list_admin(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse("borrowing:borrowing-list")
+        self.assertQueryBudget(3, "get", url, data={"is_active": "true"})
+        self.assertConstantQueries(url, self.add_borrowings)
+
+    def test_borrowing_retrieve(self):
+        url = reverse("borrowing:borrowing-detail", args=[self.borrowing.id])
+        self.assertQueryBudget(3, "get", url)
+
+    @patch("borrowing.tasks.create_stripe_session_task")
+    def test_borrowing_create(self, _):
+        payload = {
+            "book": self.book.id,
+            "expected_return_date": timezone.now().date() + timedelta(days=3),
+        }
+        # Includes the lookup of the user's waitlist hold on the book.
+        res = self.assertQueryBudget(
+            12, "post", reverse("borrowing:borrowing-list"), data=payload
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    @patch("borrowing.tasks.create_stripe_session_task")
+    def test_borrowing_checkout(self, _):
+        url = reverse("borrowing:borrowing-checkout")
+        expected_return_date = timezone.now().date() + timedelta(days=3)
+        Payment.objects.update(status=Payment.StatusChoices.PAID)
+
+        for size in (1, 5):
+            Borrowing.objects.all().delete()
+            call_command("rebuild_account_summaries", stdout=io.StringIO())
+            books = [sample_book() for _ in range(size)]
+            # Includes one lookup of the user's waitlist holds.
+            res = self.assertQueryBudget(
+                11,
+                "post",
+                url,
+                data={
+                    "books": [book.id for book in books],
+                    "expected_return_date": expected_return_date,
+                },
+                format="json",
+            )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_borrowing_return(self):
+        url = reverse(
+            "borrowing:borrowing-book-return", args=[self.borrowing.id]
+        )
+        # One more than before the waitlist: the head of the queue.
+        res = self.assertQueryBudget(8, "post", url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_payment_list(self):
+        url = reverse("borrowing:payment-list")
+        self.assertQueryBudget(1, "get", url)
+        self.assertConstantQueries(url, self.add_borrowings)
+
+    def test_payment_retrieve(self):
+        url = reverse("borrowing:payment-detail", args=[self.payment.id])
+        self.assertQueryBudget(1, "get", url)
+
+    def test_payment_success(self):
+        url = reverse("borrowing:payment_success", args=[self.payment.id])
+        self.assertQueryBudget(1, "get", url)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+    def test_payment_webhook(self):
+        Payment.objects.update(status=Payment.StatusChoices.PENDING)
+        payload = json.dumps(
+            {
+                "id": "evt_1",
+                "type": "checkout.session.completed",
+                "data": {
+                    "object": {"id": "cs_test", "payment_status": "paid"}
+                },
+            }
+        )
+        url = reverse("borrowing:payment-webhook")
+        signature = sign_stripe_payload(payload, "whsec_test")
+
+        for budget in (10, 3):
+            self.assertQueryBudget(
+                budget,
+                "post",
+                url,
+                data=payload,
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=signature,
+            )
+
+    def test_payment_cancel(self):
+        url = reverse("borrowing:payment_cancel", args=[self.payment.id])
+        self.assertQueryBudget(0, "get", url)
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    def obtain_tokens(self):
+        return self.client.post(
+            reverse("user:token_obtain_pair"),
+            {"email": "user@test.com", "password": "testpass"},
+        ).data
+
+    def test_register(self):
+        res = self.assertQueryBudget(
+            2,
+            "post",
+            reverse("user:create"),
+            data={"email": "new@test.com", "password": "newpass"},
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_token_obtain(self):
+        self.assertQueryBudget(
+            2,
+            "post",
+            reverse("user:token_obtain_pair"),
+            data={"email": "user@test.com", "password": "testpass"},
+        )
+
+    def test_token_refresh(self):
+        tokens = self.obtain_tokens()
+        self.assertQueryBudget(
+            0,
+            "post",
+            reverse("user:token_refresh"),
+            data={"refresh": tokens["refresh"]},
+        )
+
+    def test_token_verify(self):
+        tokens = self.obtain_tokens()
+        self.assertQueryBudget(
+            0,
+            "post",
+            reverse("user:token_verify"),
+            data={"token": tokens["access"]},
+        )
+
+    def test_me(self):
+        tokens = self.obtain_tokens()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"
+        )
+        url = reverse("user:manage")
+        self.assertQueryBudget(1, "get", url)
+        self.assertQueryBudget(
+            3, "patch", url, data={"email": "user@test.com"}
+        )
+
+    def test_account_summary(self):
+        tokens = self.obtain_tokens()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"
+        )
+        get_account_summary(self.user.id)
+        self.assertQueryBudget(2, "get", reverse("user:summary"))
+
+
+class ValuesListCompatibilityTests(QueryBudgetTestCase):
+    """The values-based list must render the serializers' exact bytes."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+        sample_book(title="Über «Dune»   日本", daily_fee="1.50")
+        for book in Book.objects.all():
+            sample_borrowing(self.user, book)
+        returned = sample_borrowing(
+            self.admin, self.book, actual_return_date=timezone.now().date()
+        )
+        Payment.objects.create(
+            borrowing=returned,
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.FINE,
+            money_to_pay="3.5",
+        )
+
+    def get_both(self, url, **params):
+        fast = self.client.get(url, params)
+
+        def serializer_list(view, request, *args, **kwargs):
+            return super(ValuesListMixin, view).list(request, *args, **kwargs)
+
+        with patch.object(ValuesListMixin, "list", serializer_list), patch(
+            "library_service.renderers.OrjsonRenderer.render",
+            JSONRenderer.render,
+        ):
+            slow = self.client.get(url, params)
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        return fast.content, slow.content
+
+    def test_book_list(self):
+        fast, slow = self.get_both(reverse("book:book-list"), page_size=1)
+        self.assertEqual(fast, slow)
+        fast, slow = self.get_both(reverse("book:book-list"), search="dune")
+        self.assertEqual(fast, slow)
+
+    def test_borrowing_list(self):
+        url = reverse("borrowing:borrowing-list")
+        fast, slow = self.get_both(url)
+        self.assertEqual(fast, slow)
+        fast, slow = self.get_both(url, is_active="true", page_size=1)
+        self.assertEqual(fast, slow)
+
+
+class AsyncReadViewTests(TestCase):
+    """The async read views must answer exactly like the sync ones."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.create_user(
+            "user@test.com", "testpass"
+        )
+        self.admin = get_user_model().objects.create_user(
+            "admin@test.com", "testpass", is_staff=True
+        )
+        self.book = sample_book()
+        sample_book(title="Über «Dune»   日本", daily_fee="1.50")
+        for book in Book.objects.all():
+            self.borrowing = sample_borrowing(self.user, book)
+        self.token = str(AccessToken.for_user(self.user))
+
+    def get_async(self, view, url, user=None, **extra):
+        request = self.factory.get(url, **extra)
+        if user is not None:
+            force_authenticate(request, user)
+        kwargs = {}
+        if url.rstrip("/").split("/")[-1].isdigit():
+            kwargs["pk"] = int(url.rstrip("/").split("/")[-1])
+        return async_to_sync(view)(request, **kwargs)
+
+    def get_sync(self, url, user=None, **extra):
+        self.client.force_authenticate(user)
+        return self.client.get(url, **extra)
+
+    def assertSameResponse(self, view, url, user=None, **extra):
+        expected = self.get_sync(url, user, **extra)
+        response = self.get_async(view, url, user, **extra)
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_book_reads(self):
+        books = BookReadView.as_view({"get": "list"})
+        book = BookReadView.as_view({"get": "retrieve"})
+
+        self.assertSameResponse(books, reverse("book:book-list"))
+        response = self.assertSameResponse(
+            books, reverse("book:book-list") + "?page_size=1"
+        )
+        response = self.assertSameResponse(
+            books, json.loads(response.content)["next"]
+        )
+        self.assertSameResponse(
+            books, json.loads(response.content)["previous"]
+        )
+        self.assertSameResponse(
+            books, reverse("book:book-list") + "?search=dune"
+        )
+        self.assertSameResponse(
+            book, reverse("book:book-detail", args=[self.book.id])
+        )
+        self.assertSameResponse(book, reverse("book:book-detail", args=[0]))
+
+    def test_anonymous_book_reads_are_cached(self):
+        books = BookReadView.as_view({"get": "list"})
+        url = reverse("book:book-list")
+
+        self.assertEqual(self.get_async(books, url)["X-Cache"], "MISS")
+        self.assertEqual(self.get_async(books, url)["X-Cache"], "HIT")
+
+    def test_borrowing_and_payment_reads(self):
+        borrowings = BorrowingReadView.as_view({"get": "list"})
+        borrowing = BorrowingReadView.as_view({"get": "retrieve"})
+        payments = PaymentReadView.as_view({"get": "list"})
+
+        for user in (None, self.user, self.admin):
+            self.assertSameResponse(
+                borrowings, reverse("borrowing:borrowing-list"), user
+            )
+            self.assertSameResponse(
+                borrowing,
+                reverse(
+                    "borrowing:borrowing-detail", args=[self.borrowing.id]
+                ),
+                user,
+            )
+            self.assertSameResponse(
+                payments, reverse("borrowing:payment-list"), user
+            )
+        self.assertSameResponse(
+            borrowings,
+            reverse("borrowing:borrowing-list") + "?is_active=true",
+            self.admin,
+        )
+
+    def test_jwt_authentication(self):
+        borrowings = BorrowingReadView.as_view({"get": "list"})
+        url = reverse("borrowing:borrowing-list")
+
+        response = self.assertSameResponse(
+            borrowings, url, HTTP_AUTHORIZATION=f"Bearer {self.token}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.assertSameResponse(
+            borrowings, url, HTTP_AUTHORIZATION="Bearer invalid"
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_conditional_get(self):
+        borrowings = BorrowingReadView.as_view({"get": "list"})
+        url = reverse("borrowing:borrowing-list")
+        etag = self.get_sync(url, self.user)["ETag"]
+
+        response = self.get_async(
+            borrowings, url, self.user, HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_other_methods_use_the_sync_viewset(self):
+        view = BookReadView.as_view({"get": "list", "post": "create"})
+        request = self.factory.post(
+            reverse("book:book-list"),
+            {
+                "title": "New",
+                "author": "Author",
+                "cover": "HARD",
+                "inventory": 1,
+                "daily_fee": 1,
+            },
+        )
+        force_authenticate(request, self.admin)
+
+        response = async_to_sync(view)(request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Book.objects.filter(title="New").exists())
+
+
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaRoutingTests(TestCase):
+    """The test ``replica`` database stands in for a replica that has
+    not caught up: rows created in ``default`` are missing from it."""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@test.com", "testpass"
+        )
+        self.admin = get_user_model().objects.create_user(
+            "admin@test.com", "testpass", is_staff=True
+        )
+        self.book = sample_book()
+        self.borrowing = sample_borrowing(self.user, self.book)
+
+    def get_results(self, url):
+        return self.client.get(url).data["results"]
+
+    def test_list_and_retrieve_read_from_the_replica(self):
+        self.client.force_authenticate(self.user)
+
+        self.assertEqual(self.get_results(reverse("book:book-list")), [])
+        self.assertEqual(
+            self.get_results(reverse("borrowing:borrowing-list")), []
+        )
+        res = self.client.get(
+            reverse(
+                "borrowing:payment-detail",
+                args=[self.borrowing.payments.get().id],
+            )
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_writes_go_to_the_primary_and_pin_the_writer(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.client.post(
+            reverse("book:book-list"),
+            {
+                "title": "New",
+                "author": "Author",
+                "cover": "HARD",
+                "inventory": 1,
+                "daily_fee": 1,
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            Book.objects.using("default").filter(pk=res.data["id"])
+        )
+        self.assertFalse(Book.objects.using("replica").exists())
+        self.assertTrue(is_pinned_to_primary(self.admin.id))
+        self.assertEqual(len(self.get_results(reverse("book:book-list"))), 2)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.get_results(reverse("book:book-list")), [])
+
+    def test_reads_return_to_the_replica_once_the_pin_expires(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(
+            reverse(
+                "borrowing:borrowing-book-return", args=[self.borrowing.id]
+            )
+        )
+        self.assertTrue(is_pinned_to_primary(self.user.id))
+        self.assertEqual(
+            len(self.get_results(reverse("borrowing:borrowing-list"))), 1
+        )
+
+        cache.clear()
+
+        self.assertEqual(
+            self.get_results(reverse("borrowing:borrowing-list")), []
+        )
+
+    def test_async_reads_follow_the_same_routing(self):
+        request = APIRequestFactory().get(reverse("book:book-list"))
+        force_authenticate(request, self.user)
+
+        res = async_to_sync(BookReadView.as_view({"get": "list"}))(request)
+
+        self.assertEqual(json.loads(res.content)["results"], [])
+
+    def test_async_reads_of_a_pinned_user_stay_on_the_primary(self):
+        pin_to_primary(self.user.id)
+        request = APIRequestFactory().get(reverse("borrowing:borrowing-list"))
+        force_authenticate(request, self.user)
+
+        res = async_to_sync(BorrowingReadView.as_view({"get": "list"}))(
+            request
+        )
+
+        self.assertEqual(len(json.loads(res.content)["results"]), 1)
@@ -0,0 +1,237 @@
+import codecs
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_BATCH_SIZE = 1000
+IMPORT_POOL_WORKERS = min(4, os.cpu_count() or 1)
+MIN_PASSWORD_LENGTH = 5
+
+
+def read_rows(stream, format):
+    """Yield ``(line, row)`` pairs from a CSV or NDJSON text stream.
+
+    Rows that cannot be decoded are yielded as ``(line, error)`` with
+    an exception instead of a dict.
+    """
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == "ndjson":
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as error:
+                yield line, error
+                continue
+            if not isinstance(row, dict):
+                row = ValueError("Expected a JSON object")
+            yield line, row
+    else:
+        raise ValueError(f"Unknown import format: {format}")
+
+
+def format_from_name(name):
+    extension = os.path.splitext(name)[1].lstrip(".").lower()
+    return "ndjson" if extension in ("ndjson", "jsonl") else "csv"
+
+
+def _clean_row(row):
+    email = get_user_model().objects.normalize_email(
+        (row.get("email") or "").strip()
+    )
+    validate_email(email)
+    password = row.get("password") or ""
+    if len(password) < MIN_PASSWORD_LENGTH:
+        raise ValidationError(
+            f"Password must have at least {MIN_PASSWORD_LENGTH} characters"
+        )
+    return {
+        "email": email,
+        "password": password,
+        "first_name": row.get("first_name") or "",
+        "last_name": row.get("last_name") or "",
+    }
+
+
+def _init_worker():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+    django.setup()
+
+
+_hashing_pool = None
+_hashing_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Process pool shared by every import run in this process.
+
+    Started on first use with ``IMPORT_POOL_WORKERS`` processes, so
+    concurrent uploads queue for the same workers instead of each
+    starting a pool of their own.
+    """
+    global _hashing_pool
+    with _hashing_pool_lock:
+        if _hashing_pool is None:
+            _hashing_pool = ProcessPoolExecutor(
+                IMPORT_POOL_WORKERS, initializer=_init_worker
+            )
+        return _hashing_pool
+
+
+def _discard_hashing_pool(pool):
+    global _hashing_pool
+    with _hashing_pool_lock:
+        if _hashing_pool is pool:
+            _hashing_pool = None
+    pool.shutdown(wait=False)
+
+
+class UserImporter:
+    """Create users from rows in batches, hashing passwords in parallel.
+
+    Each batch drops invalid rows and emails that already exist, hashes
+    the remaining passwords across ``workers`` processes (in-process
+    when ``workers`` is 0, or on a given ``pool``) and inserts them with
+    one ``bulk_create``. Should one of the emails be registered in
+    the meantime, the insert is retried without it and the row
+    counts as skipped.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, workers=None, pool=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.pool = pool
+
+    def run(self, rows):
+        start = time.perf_counter()
+        report = {"processed": 0, "created": 0, "skipped": 0, "errors": []}
+
+        if self.pool is not None:
+            try:
+                self._import(rows, self.pool, report)
+            except BrokenProcessPool:
+                _discard_hashing_pool(self.pool)
+                raise
+        elif self.workers == 0:
+            self._import(rows, None, report)
+        else:
+            with ProcessPoolExecutor(
+                self.workers, initializer=_init_worker
+            ) as pool:
+                self._import(rows, pool, report)
+
+        duration = time.perf_counter() - start
+        report["duration"] = duration
+        report["rows_per_second"] = (
+            report["processed"] / duration if duration else 0.0
+        )
+        return report
+
+    def _hash_passwords(self, passwords, pool):
+        if pool is None:
+            return map(make_password, passwords)
+        workers = self.workers or os.cpu_count() or 1
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return pool.map(make_password, passwords, chunksize=chunksize)
+
+    def _import(self, rows, pool, report):
+        rows = iter(rows)
+        seen = set()
+        while batch := list(islice(rows, self.batch_size)):
+            report["processed"] += len(batch)
+            users = self._clean_batch(batch, seen, report)
+            if not users:
+                continue
+
+            hashes = self._hash_passwords(
+                [user["password"] for user in users], pool
+            )
+            report["created"] += self._insert(
+                [
+                    {**user, "password": password_hash}
+                    for user, password_hash in zip(users, hashes)
+                ],
+                report,
+            )
+
+    def _insert(self, users, report):
+        """Insert users, skipping emails registered since they were cleaned.
+
+        Returns the number of users inserted.
+        """
+        while users:
+            try:
+                with transaction.atomic():
+                    get_user_model().objects.bulk_create(
+                        get_user_model()(**user) for user in users
+                    )
+                return len(users)
+            except IntegrityError:
+                taken = set(
+                    get_user_model()
+                    .objects.filter(
+                        email__in=[user["email"] for user in users]
+                    )
+                    .values_list("email", flat=True)
+                )
+                if not taken:
+                    raise
+                report["skipped"] += len(taken)
+                users = [user for user in users if user["email"] not in taken]
+        return 0
+
+    def _clean_batch(self, batch, seen, report):
+        users = []
+        for line, row in batch:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                user = _clean_row(row)
+            except (ValidationError, ValueError) as error:
+                message = "; ".join(getattr(error, "messages", [str(error)]))
+                report["errors"].append({"line": line, "error": message})
+                continue
+
+            if user["email"] in seen:
+                report["skipped"] += 1
+                continue
+            seen.add(user["email"])
+            users.append(user)
+
+        existing = set(
+            get_user_model()
+            .objects.filter(email__in=[user["email"] for user in users])
+            .values_list("email", flat=True)
+        )
+        report["skipped"] += len(existing)
+        return [user for user in users if user["email"] not in existing]
+
+
+def import_users(stream, format, **options):
+    """Import users from a text stream, see ``UserImporter``."""
+    return UserImporter(**options).run(read_rows(stream, format))
+
+
+def import_users_from_file(file, format, **options):
+    """Import users from a binary file object, decoding it as UTF-8."""
+    return import_users(
+        codecs.iterdecode(file, "utf-8-sig"), format, **options
+    )
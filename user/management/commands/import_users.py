@@ -0,0 +1,71 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.bulk_import import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_FORMATS,
+    format_from_name,
+    import_users,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users from a CSV or NDJSON file with email, password, "
+        "first_name and last_name, hashing passwords in a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, '-' for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="Defaults to the file extension, csv for stdin.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=IMPORT_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Hashing processes, 0 hashes in this process. "
+            "Defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            "--output", help="Write the full report to this JSON file."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or (
+            "csv" if path == "-" else format_from_name(path)
+        )
+        import_options = {
+            "batch_size": options["batch_size"],
+            "workers": options["workers"],
+        }
+
+        if path == "-":
+            report = import_users(sys.stdin, format, **import_options)
+        else:
+            try:
+                with open(path, encoding="utf-8-sig", newline="") as stream:
+                    report = import_users(stream, format, **import_options)
+            except OSError as error:
+                raise CommandError(error)
+
+        for error in report["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+        self.stdout.write(
+            f"Processed {report['processed']} rows in "
+            f"{report['duration']:.2f}s "
+            f"({report['rows_per_second']:.1f} rows/s): "
+            f"{report['created']} created, {report['skipped']} skipped, "
+            f"{len(report['errors'])} errors."
+        )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
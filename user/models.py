@@ -48,3 +48,26 @@ class User(AbstractUser):
     REQUIRED_FIELDS = []
 
     objects = UserManager()
+
+
+class AccountSummary(models.Model):
+    """Running totals of a user's loans and debts.
+
+    Kept up to date in the same transactions that create borrowings,
+    returns and payment status changes.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="account_summary",
+    )
+    active_borrowings = models.IntegerField(default=0)
+    pending_payments = models.IntegerField(default=0)
+    outstanding_balance = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0
+    )
+
+    def __str__(self):
+        return f"Account summary of {self.user_id}"
@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from user.bulk_import import IMPORT_FORMATS
+from user.models import AccountSummary
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -31,3 +35,29 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
         )
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Embed the claims ``StatelessJWTAuthentication`` relies on."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["email"] = user.email
+        token["is_staff"] = user.is_staff
+        return token
+
+
+class AccountSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AccountSummary
+        fields = (
+            "active_borrowings",
+            "pending_payments",
+            "outstanding_balance",
+        )
+
+
+class UserImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
@@ -1,3 +1,199 @@
+import io
+import json
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.authentication import LibraryTokenUser, StatelessJWTAuthentication
+from user.bulk_import import UserImporter, get_hashing_pool, import_users
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@test.com", "testpass"
+        )
+        tokens = self.client.post(
+            reverse("user:token_obtain_pair"),
+            {"email": "user@test.com", "password": "testpass"},
+        ).data
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"
+        )
+        self.access = AccessToken(tokens["access"])
+
+    def test_token_carries_user_claims(self):
+        self.assertEqual(self.access["user_id"], self.user.id)
+        self.assertEqual(self.access["email"], "user@test.com")
+        self.assertFalse(self.access["is_staff"])
+
+    def test_requests_do_not_load_the_user_once_cached(self):
+        url = reverse("user:summary")
+        self.client.get(url)
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["X-DB-Query-Count"], "1")
+
+    def test_views_needing_the_model_load_it(self):
+        url = reverse("user:manage")
+        self.client.get(url)
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.data["email"], "user@test.com")
+        self.assertEqual(res["X-DB-Query-Count"], "1")
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(reverse("user:summary"))
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(reverse("user:summary"))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stale_staff_claim_is_rejected(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(reverse("user:summary"))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_authentication_checks_user_state(self):
+        authentication = StatelessJWTAuthentication()
+
+        user = await authentication.aget_user(self.access)
+        self.assertEqual(user.instance, self.user)
+
+        await cache.aclear()
+        self.user.is_active = False
+        await self.user.asave()
+        with self.assertRaises(InvalidToken):
+            await authentication.aget_user(self.access)
+
+    def test_token_user_exposes_claims(self):
+        user = LibraryTokenUser(self.access)
+
+        self.assertEqual(user.id, self.user.id)
+        self.assertEqual(user.email, "user@test.com")
+        self.assertFalse(user.is_staff)
+
+
+class UserImportTests(TestCase):
+    CSV = (
+        "email,password,first_name\n"
+        "new@test.com,newpass,New\n"
+        "user@test.com,testpass,Existing\n"
+        "bad-email,testpass,\n"
+        "short@test.com,abc,\n"
+        "new@test.com,newpass,Duplicate\n"
+    )
+
+    def setUp(self):
+        get_user_model().objects.create_user("user@test.com", "testpass")
+
+    def test_import_csv_skips_existing_and_reports_errors(self):
+        report = import_users(io.StringIO(self.CSV), "csv", workers=0)
+
+        self.assertEqual(report["processed"], 5)
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(report["skipped"], 2)
+        self.assertEqual([error["line"] for error in report["errors"]], [4, 5])
+
+        user = get_user_model().objects.get(email="new@test.com")
+        self.assertEqual(user.first_name, "New")
+        self.assertTrue(user.check_password("newpass"))
+
+    def test_import_ndjson_hashes_in_process_pool(self):
+        rows = [
+            {"email": f"user{number}@test.com", "password": "password"}
+            for number in range(3)
+        ]
+        rows = "\n".join(map(json.dumps, rows)) + "\nnot json\n"
+
+        report = import_users(
+            io.StringIO(rows), "ndjson", workers=2, batch_size=2
+        )
+
+        self.assertEqual(report["created"], 3)
+        self.assertEqual(report["errors"][0]["line"], 4)
+        self.assertTrue(
+            get_user_model()
+            .objects.get(email="user2@test.com")
+            .check_password("password")
+        )
+
+    def test_rows_losing_an_insert_race_are_skipped(self):
+        hash_passwords = UserImporter._hash_passwords
+
+        def register_concurrently(importer, passwords, pool):
+            get_user_model().objects.create_user("new@test.com", "other")
+            return hash_passwords(importer, passwords, pool)
+
+        with patch.object(
+            UserImporter, "_hash_passwords", register_concurrently
+        ):
+            report = import_users(io.StringIO(self.CSV), "csv", workers=0)
+
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(report["skipped"], 3)
+        self.assertTrue(
+            get_user_model()
+            .objects.get(email="new@test.com")
+            .check_password("other")
+        )
+
+    def test_command_reports_throughput(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as file:
+            file.write(self.CSV)
+            file.flush()
+            stdout = io.StringIO()
+            call_command(
+                "import_users",
+                file.name,
+                workers=0,
+                stdout=stdout,
+                stderr=io.StringIO(),
+            )
+
+        self.assertIn("rows/s", stdout.getvalue())
+        self.assertIn("1 created, 2 skipped, 2 errors", stdout.getvalue())
+
+    def test_endpoint_is_admin_only(self):
+        client = APIClient()
+        url = reverse("user:import")
+        upload = SimpleUploadedFile("users.csv", self.CSV.encode())
+
+        client.force_authenticate(
+            get_user_model().objects.get(email="user@test.com")
+        )
+        res = client.post(url, {"file": upload}, format="multipart")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = get_user_model().objects.create_user(
+            "admin@test.com", "testpass", is_staff=True
+        )
+        client.force_authenticate(admin)
+        upload.seek(0)
+        with patch("user.views.import_users_from_file") as import_mock:
+            import_mock.return_value = {"created": 1}
+            res = client.post(url, {"file": upload}, format="multipart")
 
-# Create your tests here.
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(import_mock.call_args.args[1], "csv")
+        self.assertIs(import_mock.call_args.kwargs["pool"], get_hashing_pool())
@@ -6,7 +6,12 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 
-from user.views import CreateUserView, ManageUserView
+from user.views import (
+    AccountSummaryView,
+    CreateUserView,
+    ImportUsersView,
+    ManageUserView,
+)
 
 urlpatterns = [
     path("register/", CreateUserView.as_view(), name="create"),
@@ -14,6 +19,8 @@ urlpatterns = [
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
     path("me/", ManageUserView.as_view(), name="manage"),
+    path("me/summary/", AccountSummaryView.as_view(), name="summary"),
+    path("import/", ImportUsersView.as_view(), name="import"),
 ]
 
 app_name = "user"
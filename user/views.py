@@ -1,8 +1,20 @@
-from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework import generics, status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 
-from user.serializers import UserSerializer
+from borrowing.account_summary import get_account_summary
+from user.authentication import StatelessJWTAuthentication, get_user_instance
+from user.bulk_import import (
+    format_from_name,
+    get_hashing_pool,
+    import_users_from_file,
+)
+from user.serializers import (
+    AccountSummarySerializer,
+    UserImportSerializer,
+    UserSerializer,
+)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -11,8 +23,38 @@ class CreateUserView(generics.CreateAPIView):
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (StatelessJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        return get_user_instance(self.request.user)
+
+
+class AccountSummaryView(generics.RetrieveAPIView):
+    serializer_class = AccountSummarySerializer
+    authentication_classes = (StatelessJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get_object(self):
+        return get_account_summary(self.request.user.id)
+
+
+class ImportUsersView(generics.GenericAPIView):
+    """Create users from an uploaded CSV or NDJSON file"""
+
+    serializer_class = UserImportSerializer
+    authentication_classes = (StatelessJWTAuthentication,)
+    permission_classes = (IsAdminUser,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file = serializer.validated_data["file"]
+        format = serializer.validated_data.get(
+            "format", format_from_name(file.name)
+        )
+
+        report = import_users_from_file(file, format, pool=get_hashing_pool())
+
+        return Response(report, status=status.HTTP_200_OK)